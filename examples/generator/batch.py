@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Batch driver which generates the examples of many topologies without any interaction. The jobs are given in a manifest
+(json), the options in defaults apply to all jobs unless a job overrides them:
+
+    {"defaults": {"egresses": 0.3, "num_prefixes": [100, 1000], "seed": 1, "formats": ["columns", "rollup"]},
+     "jobs": [{"graph": "zoo/Cogentco.graphml"},
+              {"graph": "zoo/Kdl.graphml", "egresses": 40, "output": "kdl/kdl"}]}
+
+Each job needs the graph and the egresses (number or, if it is a float, fraction of the nodes). The output defaults to
+<output_path>/<graph>/<graph>, the examples are written to <output>_<num_prefixes> as by the example generator. The
+further options are num_prefixes, seed, organisations, rib, formats, chunk_size, workers, aggregation, fec_traffic,
+epochs, epoch_correlation, pipeline_depth and plots (default false). Relative paths are relative to the manifest.
+
+Each job runs the example generator in a process of its own whose address space is limited to --memory-limit MB, at
+most --jobs of them at once. The RIB, the ASN to organisation mapping and the topologies are parsed once before the jobs
+start and the jobs read them from the shared cache. A job whose examples exist and whose options and inputs did not
+change since it last succeeded (recorded in <output>.job.json) is skipped. The outcome of all jobs is written to
+batch.json in the output directory.
+"""
+
+import argparse
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import subprocess32 as subprocess
+import sys
+import time
+
+import rib_cache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import ndb_topology
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example_generator.py')
+BATCH_FILE = 'batch.json'
+STAMP_SUFFIX = '.job.json'
+
+# limits the address space of the interpreter which then replaces itself by the job, such that no python code runs in
+# the forked process before exec (the jobs are started from several threads)
+LIMIT_MEMORY = ('import os, resource, sys; limit = int(sys.argv[1]); '
+                'resource.setrlimit(resource.RLIMIT_AS, (limit, limit)); os.execv(sys.argv[2], sys.argv[2:])')
+
+DEFAULTS = {
+    'num_prefixes': [100, 1000, 10000],
+    'seed': None,
+    'organisations': 'as_to_org.txt',
+    'rib': 'full-ipv4-rib.out',
+    'plots': False
+}
+
+# job option -> option of the example generator
+GENERATOR_OPTIONS = {
+    'formats': '--formats',
+    'chunk_size': '--chunk-size',
+    'workers': '--workers',
+    'aggregation': '--aggregation',
+    'fec_traffic': '--fec-traffic',
+    'epochs': '--epochs',
+    'epoch_correlation': '--epoch-correlation',
+    'pipeline_depth': '--pipeline-depth'
+}
+
+
+def load_manifest(manifest_file, output_path):
+    # returns the jobs of the manifest with the defaults applied and all paths made absolute
+    with open(manifest_file, 'r') as infile:
+        manifest = json.load(infile)
+    base_path = os.path.dirname(os.path.abspath(manifest_file))
+
+    jobs = list()
+    for job_options in manifest['jobs']:
+        job = dict(DEFAULTS)
+        job.update(manifest.get('defaults', dict()))
+        job.update(job_options)
+
+        for key in ['graph', 'egresses']:
+            if job.get(key) is None:
+                raise ValueError('JOB WITHOUT %s: %s' % (key.upper(), json.dumps(job_options)))
+        unknown = set(job) - set(DEFAULTS) - set(GENERATOR_OPTIONS) - {'graph', 'egresses', 'output'}
+        if unknown:
+            raise ValueError('UNKNOWN JOB OPTIONS: %s' % ', '.join(sorted(unknown)))
+
+        name = os.path.splitext(os.path.basename(job['graph']))[0]
+        if 'output' in job:
+            job['output'] = os.path.join(base_path, job['output'])
+        else:
+            job['output'] = os.path.join(os.path.abspath(output_path), name, name)
+        for key in ['graph', 'organisations', 'rib']:
+            job[key] = os.path.join(base_path, job[key])
+        job['name'] = name
+        jobs.append(job)
+
+    outputs = [job['output'] for job in jobs]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError('SEVERAL JOBS WRITE TO THE SAME OUTPUT')
+    return jobs
+
+
+def get_example_paths(job):
+    return ['%s_%d' % (job['output'], n_p) if n_p else '%s_all' % (job['output'], ) for n_p in job['num_prefixes']]
+
+
+def get_file_signature(input_file):
+    stat = os.stat(input_file)
+    return [os.path.abspath(input_file), stat.st_size, int(stat.st_mtime)]
+
+
+def get_signature(job):
+    # options and inputs of a job, the job is up to date as long as they do not change
+    return {
+        'job': job,
+        'graph': ndb_topology.get_content_hash(job['graph']),
+        'organisations': get_file_signature(job['organisations']),
+        'rib': get_file_signature(job['rib'])
+    }
+
+
+def is_up_to_date(job, signature):
+    stamp_file = job['output'] + STAMP_SUFFIX
+    if not os.path.exists(stamp_file):
+        return False
+    with open(stamp_file, 'r') as infile:
+        if json.load(infile) != json.loads(json.dumps(signature)):
+            return False
+    return all(os.path.exists(os.path.join(example_path, 'config.json')) for example_path in get_example_paths(job))
+
+
+def get_command(job, cache_dir):
+    command = [sys.executable, GENERATOR, job['graph'], job['output'], '--automatically',
+               '--egresses', str(job['egresses']), '--organisations', job['organisations'], '--rib', job['rib'],
+               '--cache-dir', cache_dir, '--num-prefixes'] + [str(n_p or 0) for n_p in job['num_prefixes']]
+    if job['seed'] is not None:
+        command += ['--seed', str(job['seed'])]
+    if not job['plots']:
+        command.append('--no-plots')
+    for option, generator_option in sorted(GENERATOR_OPTIONS.iteritems()):
+        if job.get(option) is not None:
+            values = job[option] if isinstance(job[option], list) else [job[option]]
+            command += [generator_option] + [str(value) for value in values]
+    return command
+
+
+class BatchRunner(object):
+    def __init__(self, jobs, output_path, num_jobs=1, memory_limit=None, cache_dir='.ndb_cache', force=False):
+        self.jobs = jobs
+        self.output_path = output_path
+        self.num_jobs = num_jobs
+        self.memory_limit = memory_limit
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.force = force
+
+    def prepare(self):
+        # parse all inputs once, the jobs then only read them from the cache
+        for input_file in sorted(set(job['organisations'] for job in self.jobs)):
+            rib_cache.load_cached(input_file, self.cache_dir, rib_cache.parse_organisations)
+        for input_file in sorted(set(job['rib'] for job in self.jobs)):
+            rib_cache.load_cached(input_file, self.cache_dir, rib_cache.parse_rib)
+        for graph_file in sorted(set(job['graph'] for job in self.jobs)):
+            ndb_topology.load_graphml(graph_file, self.cache_dir)
+
+    def get_command(self, job):
+        command = get_command(job, self.cache_dir)
+        if self.memory_limit:
+            command = [sys.executable, '-c', LIMIT_MEMORY, str(int(self.memory_limit * 1024 * 1024))] + command
+        return command
+
+    def run_job(self, job):
+        result = {'name': job['name'], 'output': job['output'], 'log': job['output'] + '.log'}
+        signature = get_signature(job)
+        if not self.force and is_up_to_date(job, signature):
+            result['status'] = 'skipped'
+            return result
+
+        if not os.path.exists(os.path.dirname(job['output'])):
+            os.makedirs(os.path.dirname(job['output']))
+
+        start = time.time()
+        with open(result['log'], 'w') as log:
+            with open(os.devnull, 'r') as devnull:
+                returncode = subprocess.call(self.get_command(job), stdin=devnull, stdout=log, stderr=subprocess.STDOUT,
+                                             close_fds=True, cwd=os.path.dirname(job['output']))
+        result['wall_time'] = time.time() - start
+        result['returncode'] = returncode
+
+        if returncode:
+            result['status'] = 'failed'
+        else:
+            result['status'] = 'done'
+            with open(job['output'] + STAMP_SUFFIX, 'w') as outfile:
+                json.dump(signature, outfile, indent=2, sort_keys=True)
+        return result
+
+    def run(self):
+        self.prepare()
+
+        results = list()
+        pool = ThreadPool(max(1, self.num_jobs))
+        try:
+            for result in pool.imap_unordered(self.run_job, self.jobs):
+                results.append(result)
+                print '%s: %s%s' % (result['name'], result['status'].upper(),
+                                    ' (SEE %s)' % (result['log'], ) if result['status'] == 'failed' else '')
+        finally:
+            pool.close()
+            pool.join()
+
+        if not os.path.exists(self.output_path):
+            os.makedirs(self.output_path)
+        with open(os.path.join(self.output_path, BATCH_FILE), 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+        return results
+
+
+def main(manifest_file, output_path, num_jobs, memory_limit, cache_dir, force):
+    jobs = load_manifest(manifest_file, output_path)
+    results = BatchRunner(jobs, output_path, num_jobs, memory_limit, cache_dir, force).run()
+
+    num_failed = sum(1 for result in results if result['status'] == 'failed')
+    print '%d JOBS DONE, %d SKIPPED, %d FAILED' % (sum(1 for result in results if result['status'] == 'done'),
+                                                    sum(1 for result in results if result['status'] == 'skipped'),
+                                                    num_failed)
+    return 1 if num_failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('manifest', help='json file with the jobs', type=str)
+    parser.add_argument('output_path', help='path to the directory where the examples are stored by default', type=str)
+    parser.add_argument('-j', '--jobs', help='number of jobs which run at once', type=int, default=1)
+    parser.add_argument('-m', '--memory-limit', help='limit of the address space of each job in MB', type=float)
+    parser.add_argument('--cache-dir', help='directory where the parsed inputs are cached', type=str,
+                        default='.ndb_cache')
+    parser.add_argument('-f', '--force', help='also run the jobs which are up to date', action='store_true')
+    parsed_args = parser.parse_args()
+
+    sys.exit(main(parsed_args.manifest, parsed_args.output_path, parsed_args.jobs, parsed_args.memory_limit,
+                  parsed_args.cache_dir, parsed_args.force))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Benchmark of generating, loading and scoring examples over a grid of topology sizes and numbers of prefixes. The
+topologies are either given graphml files (e.g., from the topology zoo) or synthetic graphs with the given numbers of
+nodes which are as sparse as the topology zoo graphs (a random tree plus a quarter as many additional links, the largest
+zoo graphs have 754 (Kdl), 197 (Cogentco) and 158 (UsCarrier) nodes). The RIB and the ASN to organisation mapping are
+synthetic as well, the origins of the prefixes follow a Zipf distribution over the organisations.
+
+For each topology, the example generator is run once for all numbers of prefixes (only the dump is written) and the
+phases recorded in its metrics.json are collected (e.g., get_graph, get_paths and dump). Each example is then loaded
+with load_example, indexed and scored on random specs in a fresh worker process such that the peak memory of each
+example is measured on its own. All phases are written to benchmark.json in the output directory:
+
+    {"info": {...}, "results": [{"graph": "synthetic_100", "num_nodes": 100, "num_prefixes": 1000,
+                                 "phase": "get_paths", "wall_time": 1.2, "cpu_time": 1.2, "peak_rss_mb": 80.1, ...}]}
+
+With --compare, the wall time of each phase is compared to that of an earlier report of the same grid.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from load_example import load_example
+from ndb_index import NDBIndex
+from ndb_metrics import PhaseMetrics
+from ndb_topology import load_graphml
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example_generator.py')
+REPORT_FILE = 'benchmark.json'
+
+SPEC_FEATURES = ['ingress', 'egress', 'destination', 'shortest_path']
+
+
+def write_graph(graph_file, num_nodes, random_state):
+    # random tree (each node is attached to a random earlier node) plus num_nodes / 4 additional links
+    graph = nx.Graph()
+    graph.add_nodes_from(str(node) for node in range(num_nodes))
+    for node in range(1, num_nodes):
+        graph.add_edge(str(node), str(random_state.randint(node)))
+
+    num_links = num_nodes - 1 + num_nodes // 4
+    max_links = num_nodes * (num_nodes - 1) // 2
+    while graph.number_of_edges() < min(num_links, max_links):
+        n1, n2 = random_state.randint(num_nodes, size=2)
+        if n1 != n2:
+            graph.add_edge(str(n1), str(n2))
+
+    nx.write_graphml(graph, graph_file)
+    return graph
+
+
+def write_inputs(input_path, num_prefixes, num_organisations, random_state):
+    # as_to_org.txt with one AS per organisation and full-ipv4-rib.out with num_prefixes /24 prefixes
+    with open(os.path.join(input_path, 'as_to_org.txt'), 'w') as outfile:
+        outfile.write('# format:org_id|changed|org_name|country|source\n')
+        for i in range(num_organisations):
+            outfile.write('ORG%d|20170101|Organisation %d|CH|RIPE\n' % (i, i))
+        outfile.write('# format:aut|changed|aut_name|org_id|source\n')
+        for i in range(num_organisations):
+            outfile.write('%d|20170101|AS%d|ORG%d|RIPE\n' % (i + 1, i + 1, i))
+
+    ranks = np.arange(1, num_organisations + 1, dtype=np.float64)
+    origins = random_state.choice(num_organisations, num_prefixes, p=(1.0 / ranks) / (1.0 / ranks).sum()) + 1
+    with open(os.path.join(input_path, 'full-ipv4-rib.out'), 'w') as outfile:
+        for i, origin in enumerate(origins):
+            outfile.write('%d.%d.%d.0/24 3356 %d\n' % (1 + i // 65536, (i // 256) % 256, i % 256, origin))
+
+
+def get_specs(entries, num_specs, random_state):
+    # specs of one to three features with the values of random flows, such that each spec matches at least one flow
+    specs = list()
+    for _ in range(num_specs):
+        entry = entries[random_state.randint(len(entries))]
+        features = random_state.choice(SPEC_FEATURES, random_state.randint(1, 4), replace=False)
+        specs.append([(feature, entry.get(feature)) for feature in features])
+    return specs
+
+
+def load_and_score(example_path, num_specs, seed):
+    # runs in a worker process, returns the phases of loading, indexing and scoring the example
+    metrics = PhaseMetrics('load')
+    entries = load_example(os.path.join(example_path, 'ndb_topo.out'), os.path.join(example_path, 'ndb_dump.out'),
+                           metrics=metrics)[0]
+
+    with metrics.phase('build_index', len(entries)):
+        index = NDBIndex.from_entries(entries)
+
+    specs = get_specs(entries, num_specs, np.random.RandomState(seed))
+    with metrics.phase('score') as record:
+        for spec in specs:
+            index.query(spec)
+    record['num_specs'] = len(specs)
+    if record['wall_time'] > 0:
+        record['specs_per_second'] = len(specs) / record['wall_time']
+
+    return metrics.phases
+
+
+class Benchmark(object):
+    def __init__(self, output_path, num_prefixes, egress_fraction=0.3, num_specs=1000, seed=0):
+        self.output_path = os.path.abspath(output_path)
+        self.num_prefixes = sorted(num_prefixes)
+        self.egress_fraction = egress_fraction
+        self.num_specs = num_specs
+        self.seed = seed
+        self.random_state = np.random.RandomState(seed)
+
+        self.results = list()
+
+        # the inputs are shared by all topologies, the generator caches the parsed inputs in the same directory
+        self.input_path = os.path.join(self.output_path, 'inputs')
+        if not os.path.exists(self.input_path):
+            os.makedirs(self.input_path)
+        write_inputs(self.input_path, 2 * self.num_prefixes[-1], max(10, self.num_prefixes[-1] // 20),
+                     self.random_state)
+
+    def run(self, name, graph_file):
+        graph = load_graphml(graph_file, os.path.join(self.input_path, '.ndb_cache'))
+        num_nodes = graph.number_of_nodes()
+        num_egresses = max(1, int(round(self.egress_fraction * num_nodes)))
+
+        # generate all examples of this topology
+        example_base = os.path.join(self.output_path, name, name)
+        if not os.path.exists(os.path.dirname(example_base)):
+            os.makedirs(os.path.dirname(example_base))
+
+        command = [sys.executable, GENERATOR, os.path.abspath(graph_file), example_base, '-a', '-s', str(self.seed),
+                   '-g', str(num_egresses), '-f', 'dump', '--no-plots', '--cache-dir',
+                   os.path.join(self.input_path, '.ndb_cache'), '-n'] + [str(n_p) for n_p in self.num_prefixes]
+        log_file = '%s.log' % example_base
+        with open(log_file, 'w') as log:
+            returncode = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT, cwd=self.input_path)
+        if returncode:
+            raise RuntimeError('THE GENERATION OF %s FAILED (SEE %s)' % (name, log_file))
+
+        # each example is loaded and scored in a fresh process
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            for n_p in self.num_prefixes:
+                example_path = '%s_%d' % (example_base, n_p)
+                with open(os.path.join(example_path, 'metrics.json'), 'r') as infile:
+                    generate = json.load(infile)['generate']
+                load_phases = pool.apply(load_and_score, (example_path, self.num_specs, self.seed))
+
+                info = {
+                    'graph': name,
+                    'num_nodes': num_nodes,
+                    'num_edges': graph.number_of_edges(),
+                    'num_egresses': num_egresses,
+                    'num_prefixes': n_p,
+                    'num_flows': generate['info']['num_flows']
+                }
+                for section, phases in [('generate', generate['phases']), ('load', load_phases)]:
+                    for phase in phases:
+                        result = dict(phase)
+                        result.update(info)
+                        result['section'] = section
+                        result['phase'] = result.pop('name')
+                        self.results.append(result)
+
+                print '%s WITH %d PREFIXES DONE' % (name, n_p)
+        finally:
+            pool.close()
+            pool.join()
+
+    def write(self):
+        report = {
+            'info': {
+                'num_prefixes': self.num_prefixes,
+                'egress_fraction': self.egress_fraction,
+                'num_specs': self.num_specs,
+                'seed': self.seed,
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'networkx': nx.__version__,
+                'time': time.strftime('%Y-%m-%d %H:%M:%S')
+            },
+            'results': self.results
+        }
+        report_file = os.path.join(self.output_path, REPORT_FILE)
+        with open(report_file, 'w') as outfile:
+            json.dump(report, outfile, indent=2, sort_keys=True)
+        return report_file
+
+
+def get_key(result):
+    return result['graph'], result['num_prefixes'], result['section'], result['phase']
+
+
+def print_report(results, baseline=None):
+    # one line per phase, with the ratio of the wall time to that of the baseline report (if given)
+    baseline_times = dict((get_key(result), result['wall_time']) for result in baseline or list())
+
+    print '%-20s %8s %10s %-10s %-20s %10s %10s %10s %10s' % ('graph', 'prefixes', 'flows', 'section', 'phase', 'wall',
+                                                              'cpu', 'rss_mb', 'ratio')
+    for result in results:
+        ratio = ''
+        baseline_time = baseline_times.get(get_key(result))
+        if baseline_time:
+            ratio = '%.2f' % (result['wall_time'] / baseline_time, )
+        print '%-20s %8d %10d %-10s %-20s %10.3f %10.3f %10.1f %10s' % (
+            result['graph'], result['num_prefixes'], result['num_flows'], result['section'], result['phase'],
+            result['wall_time'], result['cpu_time'], result['peak_rss_mb'], ratio)
+
+
+def main(output_path, num_nodes, graph_files, num_prefixes, egress_fraction, num_specs, seed, compare):
+    benchmark = Benchmark(output_path, num_prefixes, egress_fraction, num_specs, seed)
+
+    graphs = [(os.path.splitext(os.path.basename(graph_file))[0], graph_file) for graph_file in graph_files]
+    for n in num_nodes:
+        graph_file = os.path.join(benchmark.input_path, 'synthetic_%d.graphml' % (n, ))
+        write_graph(graph_file, n, np.random.RandomState([seed, n]))
+        graphs.append(('synthetic_%d' % (n, ), graph_file))
+
+    for name, graph_file in graphs:
+        benchmark.run(name, graph_file)
+
+    report_file = benchmark.write()
+    print 'REPORT WRITTEN TO %s' % (report_file, )
+
+    baseline = None
+    if compare:
+        with open(compare, 'r') as infile:
+            baseline = json.load(infile)['results']
+    print_report(benchmark.results, baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output_path', help='path to the directory where the examples and the report are stored',
+                        type=str)
+    parser.add_argument('-n', '--nodes', help='numbers of nodes of the synthetic topologies', type=int, nargs='*',
+                        default=[25, 50, 100, 200])
+    parser.add_argument('-g', '--graphs', help='graphml files of additional topologies', type=str, nargs='*',
+                        default=list())
+    parser.add_argument('-p', '--prefixes', help='numbers of prefixes of the examples', type=int, nargs='+',
+                        default=[100, 1000])
+    parser.add_argument('-e', '--egress-fraction', help='fraction of the nodes which are egresses', type=float,
+                        default=0.3)
+    parser.add_argument('--specs', help='number of random specs which are scored per example', type=int,
+                        default=1000)
+    parser.add_argument('-s', '--seed', help='seed of the synthetic inputs and the generator', type=int, default=0)
+    parser.add_argument('-c', '--compare', help='earlier report to compare the wall times with', type=str)
+    parsed_args = parser.parse_args()
+
+    main(parsed_args.output_path, parsed_args.nodes, parsed_args.graphs, parsed_args.prefixes,
+         parsed_args.egress_fraction, parsed_args.specs, parsed_args.seed, parsed_args.compare)
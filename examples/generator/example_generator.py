@@ -7,71 +7,183 @@ Script to generate example datasets based on a topology zoo topology (graphml fo
 """
 
 import argparse
-import pickle
-import random
+import cPickle as pickle
 import math
 import json
 import os
-from collections import defaultdict
+from collections import defaultdict, deque
 import itertools
+import multiprocessing
+import subprocess
 import sys
 import scipy.stats
 
 import networkx as nx
 import numpy as np
 
-import matplotlib
-matplotlib.use('Agg')
+import rib_cache
+from routing import Routing
+from stage_pipeline import StagePipeline
+from stats_sketch import GeneratorStats
 
-import matplotlib.pyplot as plt
+# the storage formats are shared with the loader in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import ndb_columns
+import ndb_epochs
+import ndb_fec
+import ndb_metrics
+import ndb_rollup
+import ndb_shards
+import ndb_stream
+import ndb_topology
 
-from matplotlib import rc_file
-rc_file('matplotlibrc')
+
+# generator used by the worker processes, it is inherited from the parent process when the pool is forked
+_worker_generator = None
+
+
+def generate_organisation(task):
+    return _worker_generator.generate_organisation(*task)
 
 
 class ExampleGenerator(object):
-    def __init__(self, graph_file, output_path, automatically):
+    def __init__(self, graph_file, output_path, automatically, seed=None, formats=('dump', 'columns', 'rollup'),
+                 chunk_size=100000, workers=1, cache_dir='.ndb_cache', aggregation='flows', fec_traffic='prefix',
+                 epochs=None, epoch_correlation=0.0, plots=True, profile_dir=None, num_prefixes=(100, 1000, 10000),
+                 num_egresses=None, organisation_file='as_to_org.txt', rib_file='full-ipv4-rib.out', pipeline_depth=1):
 
-        STATS = True
         self.output_path = output_path
         self.automatically = automatically
 
+        # number (int) or fraction of the nodes (float) which are picked as egresses if automatically is set, without it
+        # the number is asked for
+        self.num_egresses = num_egresses
+
+        # output formats (dump: ndb_dump.out, columns: ndb_columns, stream: ndb_stream.out, rollup: ndb_rollup.npz,
+        # shards: ndb_shards) and the number of flows which are generated and written at once. Only the dump needs to
+        # hold all flows in memory.
+        self.formats = formats
+        self.chunk_size = chunk_size
+
+        # with the aggregation fec, all prefixes of an organisation with the same egresses form a forwarding
+        # equivalence class and are routed the same way. The classes are written to ndb_fec.out with the traffic of
+        # each prefix or the summed traffic of the class (fec_traffic prefix or sum), which takes the place of the dump.
+        # The other formats still contain the expanded flows.
+        self.aggregation = aggregation
+        if aggregation == 'fec':
+            self.formats = [output_format for output_format in formats if output_format != 'dump']
+        self.fec_traffic = fec_traffic
+
+        # number of epochs of a traffic time series over the same flows and the correlation of the traffic of a flow
+        # between two consecutive epochs, the routing and features are only computed once
+        self.epochs = epochs
+        self.epoch_correlation = epoch_correlation
+
+        # directory where the parsed input files are cached across runs
+        self.cache_dir = cache_dir
+
+        # all random decisions are drawn from this state or from the state of the respective organisation which is
+        # derived from the same seed, so a whole run is reproducible from a single seed
+        self.seed = seed if seed is not None else np.random.randint(2**31 - 1)
+        self.random_state = np.random.RandomState(self.seed)
+
         # probabilities
         self.egress_exception_probability = 0.01
         self.shortest_path_exception_probability = 0.05
         self.multi_path_probability = 0.1
 
+        # mean size of a flow
+        self.flow_size_beta = 1000.0
+
         # skew used for additional features
-        self.num_feature_values = np.random.uniform(2, 100, 12)
+        self.num_feature_values = self.random_state.uniform(2, 100, 12)
+
+        # stats of the current example, they are kept in sketches of fixed size and written to ndb_stats.json. The CDFs
+        # are plotted by plot_stats.py in background processes (if plots is set) which are waited for at the end, a
+        # failed plot fails the generator once all examples are written.
+        self.stats = None
+        self.plots = plots
+        self.plot_processes = list()
+
+        # time, memory and throughput of each phase, the phases shared by all examples are recorded once and added to
+        # the metrics.json of each example. With a profile_dir, each phase is also profiled with cProfile.
+        self.profile_dir = profile_dir
+        self.metrics = ndb_metrics.PhaseMetrics('shared', profile_dir)
 
-        # stats
-        self.stats = dict()
-        self.stats['num_egresses'] = list()
-        self.stats['organisation_size'] = list()
-        self.stats['organisation_size2'] = defaultdict(int)
-        self.stats['egress_size'] = defaultdict(int)
-        self.stats['ingress_size'] = defaultdict(int)
-        self.stats['organisation_prefixes'] = list()
+        # the dump, topology, config and metrics of an example are written by a background process while the next
+        # example is generated, at most pipeline_depth examples are being written at once (0: written before the next
+        # example is generated)
+        self.pipeline = StagePipeline(pipeline_depth)
 
         # get graph from file
-        self.graph, self.egress_nodes, self.name_to_node, self.node_to_name, self.shortest_path_lengths, \
-        self.shortest_paths, self.non_shortest_paths = self.get_graph(graph_file)
+        with self.metrics.phase('get_graph'):
+            self.graph, self.egress_nodes, self.name_to_node, self.node_to_name, self.routing = \
+                self.get_graph(graph_file)
 
         print 'GRAPH DONE'
 
+        # the organisations are independent of each other and can be split across several worker processes which
+        # share the graph and routing state with this process
+        global _worker_generator
+        _worker_generator = self
+        self.workers = workers
+        self.pool = multiprocessing.Pool(workers) if workers > 1 else None
+
         # get organisations and their prefixes from file
-        organisation_file = 'as_to_org.txt'
-        self.asn_to_organisation, self.organisations = self.load_organisations(organisation_file)
+        with self.metrics.phase('load_organisations'):
+            self.asn_to_organisation, self.organisations = self.load_organisations(organisation_file)
         # self.asn_to_organisation, self.organisations = self.load_few_organisations()
 
         print 'ORGANISATIONS DONE'
 
+        # read the full RIB once and shuffle it once, the examples for the different number of prefixes use the first
+        # prefixes of this order and are hence nested in each other
+        self.full_rib = rib_file
+        with self.metrics.phase('load_full_rib'):
+            self.rib_prefixes, self.shuffled_rib = self.load_full_rib(self.full_rib)
+
+        print 'RIB DONE'
+
+        try:
+            self.generate_examples(graph_file, output_path, num_prefixes)
+        except BaseException:
+            # stop the examples which are still being written and the workers, the plots of the examples which were
+            # written are still waited for
+            self.pipeline.terminate()
+            if self.pool:
+                self.pool.terminate()
+            raise
+        finally:
+            if self.pool:
+                self.pool.close()
+                self.pool.join()
+
+            failed_plots = self.wait_for_plots()
+
+        if failed_plots:
+            raise RuntimeError('PLOTTING THE STATISTICS FAILED FOR %s (USE --no-plots TO SKIP THE PLOTS)' %
+                               (', '.join(failed_plots), ))
+
+    def wait_for_plots(self):
+        # waits for all plot processes and returns the examples whose plot failed, each of them is reported right away
+        # such that it is not lost if the generator fails as well
+        failed_plots = list()
+        for output_path, process in self.plot_processes:
+            returncode = process.wait()
+            if returncode:
+                print 'PLOTTING %s FAILED WITH CODE %d' % (os.path.join(output_path, 'cdfs.pdf'), returncode)
+                failed_plots.append(output_path)
+        self.plot_processes = list()
+        return failed_plots
+
+    def generate_examples(self, graph_file, output_path, num_prefixes):
+        STATS = True
+
         # specify the number of prefixes if you want to restrict the number of prefixes considered. You can also specify
         # multiple numbers in the list and one example is generated for each number specified. To use all prefixes,
-        # just put None
-        num_prefixes = [100, 1000, 10000]
-
-        for n_p in num_prefixes:
+        # just put None (or 0)
+        for run_index, n_p in enumerate(num_prefixes):
+            self.run_index = run_index
             if n_p:
                 tmp_op = '%s_%d' % (output_path, n_p)
             else:
@@ -80,35 +192,66 @@ class ExampleGenerator(object):
             if not os.path.exists(tmp_op):
                 os.makedirs(tmp_op)
 
-            self.full_rib = 'full-ipv4-rib.out'
-            self.organisation_to_prefix, self.prefix_to_organisation = self.use_full_rib(n_p, None)
+            run_metrics = ndb_metrics.PhaseMetrics(str(n_p) if n_p else 'all', self.profile_dir)
 
-            # create the paths for all nodes to all prefixes
-            # parameter for flow size exponential distribution
-            paths = self.get_paths()
+            self.stats = GeneratorStats(self.routing.nodes)
+            with run_metrics.phase('use_full_rib'):
+                self.organisation_to_prefix, self.prefix_to_organisation = self.use_full_rib(n_p, None)
 
-            # write data to file for network db
-            data = {
-                'paths': paths,
+            header = {
                 'destination_to_prefix': self.organisation_to_prefix,
                 'prefix_to_destination': self.prefix_to_organisation,
                 'node_to_name': self.node_to_name,
                 'name_to_node': self.name_to_node
             }
 
-            output_file = '%s/ndb_dump.out' % tmp_op
-            with open(output_file, 'w') as outfile:
-                pickle.dump(data, outfile)
-
-            output_graph_file = '%s/ndb_topo.out' % tmp_op
-            nx.write_gpickle(self.graph, output_graph_file)
+            writers = list()
+            if 'columns' in self.formats:
+                # same data as typed columns which can be memory mapped
+                writers.append(ndb_columns.ColumnarWriter(tmp_op, self.routing.nodes, self.organisation_to_prefix,
+                                                          self.node_to_name, len(self.num_feature_values),
+                                                          int(max(self.num_feature_values))))
+            if 'stream' in self.formats:
+                writers.append(ndb_stream.StreamWriter(tmp_op, header))
+            if 'shards' in self.formats:
+                # flows partitioned by destination with an index, such that single destinations can be loaded
+                writers.append(ndb_shards.ShardWriter(tmp_op, header))
+            if 'rollup' in self.formats:
+                # traffic and number of flows grouped by the features and pairs of them
+                writers.append(ndb_rollup.RollupWriter(tmp_op, self.routing.nodes, sorted(self.organisation_to_prefix)))
+            if self.epochs:
+                # the traffic of all epochs is drawn from a random state of its own which is derived from the seed (the
+                # states of the organisations use keys of length three)
+                epoch_random_state = np.random.RandomState([self.seed, self.run_index, 0, 0])
+                writers.append(ndb_epochs.EpochWriter(tmp_op, self.epochs, self.epoch_correlation,
+                                                      self.flow_size_beta, epoch_random_state))
+
+            # create the paths for all nodes to all prefixes and write them chunk by chunk
+            # (the phase get_paths includes the streaming writers as the flows are written while they are generated)
+            paths = list()
+            num_flows = 0
+            with run_metrics.phase('get_paths') as record:
+                for chunk in self.get_paths():
+                    num_flows += len(chunk)
+                    if 'dump' in self.formats:
+                        paths.extend(chunk)
+                    for writer in writers:
+                        writer.write(chunk, self.path_table)
+                record['num_flows'] = num_flows
+
+            with run_metrics.phase('close_writers', num_flows):
+                for writer in writers:
+                    writer.close()
+
+                if self.aggregation == 'fec':
+                    ndb_fec.write_fec(tmp_op, header, self.path_table, self.fec_classes, self.fec_paths,
+                                      self.fec_traffic)
 
             # self.create_grammar_mappings(tmp_op)
 
             if STATS:
-                self.produce_stats(tmp_op)
-
-            print 'PATHS DONE FOR %s' % (str(n_p) if n_p else 'all', )
+                with run_metrics.phase('produce_stats'):
+                    self.produce_stats(tmp_op)
 
             # add config file
 
@@ -134,36 +277,80 @@ class ExampleGenerator(object):
                 ]
             }
 
-            output_file = '%s/config.json' % tmp_op
-            with open(output_file, 'w') as outfile:
-                json.dump(config_data, outfile)
+            if 'dump' not in self.formats:
+                del config_data['ndb_conf']['data']
+            if 'columns' in self.formats:
+                config_data['ndb_conf']['columns'] = ndb_columns.COLUMNS_DIR
+            if 'stream' in self.formats:
+                config_data['ndb_conf']['stream'] = ndb_stream.STREAM_FILE
+            if 'rollup' in self.formats:
+                config_data['ndb_conf']['rollup'] = ndb_rollup.ROLLUP_FILE
+            if 'shards' in self.formats:
+                config_data['ndb_conf']['shards'] = ndb_shards.SHARDS_DIR
+            if self.aggregation == 'fec':
+                config_data['ndb_conf']['fec'] = ndb_fec.FEC_FILE
+            if self.epochs:
+                config_data['ndb_conf']['epochs'] = ndb_epochs.EPOCHS_DIR
+
+            metrics_info = {
+                'graph_file': graph_file,
+                'num_prefixes': n_p,
+                'num_flows': num_flows,
+                'seed': self.seed,
+                'workers': self.workers,
+                'formats': list(self.formats)
+            }
+
+            data = None
+            if 'dump' in self.formats:
+                data = dict(header)
+                data['paths'] = paths
+                data['path_table'] = self.path_table
+
+            # write the files of this example in the background and continue with the next one
+            with run_metrics.phase('wait_pipeline'):
+                self.pipeline.wait_for_slot()
+            self.pipeline.submit('write_%s' % (run_metrics.label, ), self.write_example, tmp_op, data, config_data,
+                                 run_metrics, metrics_info)
+
+            print 'PATHS DONE FOR %s' % (str(n_p) if n_p else 'all', )
+
+        # wait for the examples which are still being written, a failed stage is raised as StageError
+        self.pipeline.join()
+
+    def write_example(self, output_path, data, config_data, run_metrics, metrics_info):
+        # writes the files of an example which are not written while the flows are generated, config.json and
+        # metrics.json are written last such that an example with a config is complete
+        if data is not None:
+            with run_metrics.phase('dump', metrics_info['num_flows']):
+                output_file = '%s/ndb_dump.out' % output_path
+                with open(output_file, 'wb') as outfile:
+                    pickle.dump(data, outfile, pickle.HIGHEST_PROTOCOL)
+
+        with run_metrics.phase('topo'):
+            output_graph_file = '%s/ndb_topo.out' % output_path
+            nx.write_gpickle(self.graph, output_graph_file)
+            self.topology.save(os.path.join(output_path, ndb_topology.TOPOLOGY_FILE))
+            ndb_columns.save_distances(output_path, self.routing.nodes, self.routing.distances)
+            ndb_columns.save_egresses(output_path, self.routing.nodes, self.prefix_egresses)
+
+        output_file = '%s/config.json' % output_path
+        with open(output_file, 'w') as outfile:
+            json.dump(config_data, outfile)
+
+        ndb_metrics.write_metrics(output_path, 'generate', self.metrics.phases + run_metrics.phases, info=metrics_info)
 
     def get_graph(self, graph_file):
-        # load graph from file
+        # load graph from file, the compiled topology is cached by the content of the file
         print 'reading graph file'
-        graph = nx.read_graphml(graph_file)
-
-        # compute the length of the shortest path between any two nodes
-        print 'computing shortest path lengths'
-        sp_lengths = nx.all_pairs_dijkstra_path_length(graph)
+        self.topology = ndb_topology.load_graphml(graph_file, self.cache_dir)
+        graph = self.topology.to_networkx()
 
-        # compute all shortest paths between any two nodes
+        # compute the length of the shortest path between any two nodes and the shortest path DAG of each node, the
+        # actual shortest and non-shortest paths are only enumerated once they are used
         print 'computing shortest paths'
-        shortest_paths = defaultdict(dict)
-        nodes = nx.nodes(graph)
-        for n1, n2 in itertools.product(nodes, nodes):
-            shortest_paths[n1][n2] = list(nx.all_shortest_paths(graph, n1, n2))
-
-        # compute some non shortest paths between any two nodes
-        if False:
-            print 'computing non-shortest paths'
-            non_shortest_paths = defaultdict(dict)
-            for n1, n2 in itertools.product(nodes, nodes):
-                cutoff = sp_lengths[n1][n2] + 1
-                tmp_paths = nx.all_simple_paths(graph, n1, n2, cutoff)
-                non_shortest_paths[n1][n2] = [tmp_path for tmp_path in tmp_paths if len(tmp_path) == cutoff]
-        else:
-            non_shortest_paths = shortest_paths
+        routing = Routing(graph)
+        nodes = routing.nodes
 
         # create node abbreviation to actual name mapping
         print 'node to name mapping'
@@ -203,10 +390,17 @@ class ExampleGenerator(object):
                 else:
                     print 'You need to specify at least one egress node'
         else:
-            num_egresses = int(raw_input('Number of Egresses? (Total number of nodes: %d)\n' % len(nodes)))
-            egress_nodes = np.random.choice(nodes, num_egresses, replace=False)
-
-        return graph, egress_nodes, name_to_node, node_to_name, sp_lengths, shortest_paths, non_shortest_paths
+            num_egresses = self.num_egresses
+            if num_egresses is None:
+                num_egresses = int(raw_input('Number of Egresses? (Total number of nodes: %d)\n' % len(nodes)))
+            elif isinstance(num_egresses, float):
+                num_egresses = max(1, int(round(num_egresses * len(nodes))))
+            if not 1 <= num_egresses <= len(nodes):
+                raise ValueError('INVALID NUMBER OF EGRESSES: %d (TOTAL NUMBER OF NODES: %d)' % (num_egresses,
+                                                                                                len(nodes)))
+            egress_nodes = self.random_state.choice(nodes, num_egresses, replace=False)
+
+        return graph, egress_nodes, name_to_node, node_to_name, routing
 
     def load_few_organisations(self):
         # load organisations and their prefixes from the file
@@ -225,63 +419,25 @@ class ExampleGenerator(object):
         return asn_to_name, names
 
     def load_organisations(self, file):
-        # load organisations and their prefixes from the file
-        asn_to_org_id = dict()
-        org_id_to_name = dict()
+        # the parsed file is cached as long as it does not change
+        return rib_cache.load_cached(file, self.cache_dir, rib_cache.parse_organisations)
 
-        names = list()
-
-        with open(file, 'r') as infile:
-            mode = -1
-            for tmp_line in infile:
-                line = tmp_line.strip()
-                if line.startswith('#'):
-                    if line.startswith('# format:org_id'):
-                        mode = 1
-                    elif line.startswith('# format:aut'):
-                        mode = 2
-                else:
-                    if mode == -1:
-                        print 'NOT READY - NO FORMAT DEFINITION'
-                        sys.exit(0)
-                    elif mode == 1:
-                        # format:org_id|changed|org_name|country|source
-                        org_id, _, org_name, _, _ = line.split('|')
-                        org_id_to_name[org_id] = org_name
-                        names.append(org_name)
-                    elif mode == 2:
-                        # format:aut|changed|aut_name|org_id|source
-                        tmp_asn, _, _, org_id, _ = line.split('|')
-                        asn = int(tmp_asn)
-                        asn_to_org_id[asn] = org_id
+    def load_full_rib(self, rib_file):
+        # returns the prefixes in the order of the RIB and the (prefix, origin) pairs in a random order, the parsed RIB
+        # is cached as long as it does not change
+        prefixes, origins = rib_cache.load_cached(rib_file, self.cache_dir, rib_cache.parse_rib)
 
-        asn_to_name = dict()
-        for asn, org_id in asn_to_org_id.iteritems():
-            asn_to_name[asn] = org_id_to_name[org_id]
+        order = self.random_state.permutation(len(prefixes))
+        shuffled_rib = zip(prefixes[order].tolist(), origins[order].tolist())
 
-        return asn_to_name, names
+        return prefixes.tolist(), shuffled_rib
 
     def use_full_rib(self, limit, variance):
         organisation_to_prefix = defaultdict(list)
         prefix_to_organisation = dict()
 
-        prefixes = list()
-        only_prefixes = list()
-        with open(self.full_rib, 'r') as infile:
-            for line in infile:
-                tmp_data = line.strip().split(' ')
-                prefix = tmp_data[0]
-
-                # deal with AS sets
-                if '{' in tmp_data[-1]:
-                    origin = int(tmp_data[-1].replace('{', '').replace('}', '').split(',')[0])
-                else:
-                    origin = int(tmp_data[-1])
-
-                prefixes.append((prefix, origin))
-                only_prefixes.append(prefix)
-
-        random.shuffle(prefixes)
+        prefixes = self.shuffled_rib
+        only_prefixes = self.rib_prefixes
 
         if not limit:
             limit = len(prefixes)
@@ -345,117 +501,350 @@ class ExampleGenerator(object):
 
         print 'THERE WERE %d UNKNOWN ORGANIZATIONS' % (len(unknown), )
 
-        for organisation, prefixes in organisation_to_prefix.iteritems():
-            self.stats['organisation_prefixes'].append(len(prefixes))
+        self.stats.update('organisation_prefixes', [len(prefixes) for prefixes in organisation_to_prefix.itervalues()])
 
         return organisation_to_prefix, prefix_to_organisation
 
-    def get_egresses(self):
+    def get_egresses(self, random_state):
         # beta=1/lambda for the egress exponential distribution - this sets the median of the number of egress to a 4th
         # of all egresses. This is roughly according to "Understanding BGP Next-hop Diversity".
         egress_beta = float(len(self.egress_nodes))/(4.0 * np.log(2.0))
         egress_beta = 4.0/np.log(2.0)
 
         # Pick the number of egresses using an exponential distribution with the scale parameter as described above
-        num_egress = int(np.random.exponential(scale=egress_beta))
+        num_egress = int(random_state.exponential(scale=egress_beta))
         if num_egress < 1:
             num_egress = 1
         elif num_egress > len(self.egress_nodes):
             num_egress = len(self.egress_nodes)
 
-        egress_nodes = np.random.choice(self.egress_nodes, num_egress, replace=False)
+        egress_nodes = random_state.choice(self.egress_nodes, num_egress, replace=False)
         return egress_nodes
 
-    def get_flow_mean(self, num_prefixes):
+    def get_flow_mean(self, num_prefixes, random_state):
         # Choose size of entire organisation according to exponential distribution, then divide it by the number of
         # of prefixes of that organisation. Use this value as mean of a normal distribution to introduce some variance
         # amongst the different prefixes of that organisation.
 
         flow_beta = 1000000.0
-        total_organisation_size = np.random.exponential(scale=flow_beta)
-        self.stats['organisation_size'].append(total_organisation_size)
+        total_organisation_size = random_state.exponential(scale=flow_beta)
 
         per_prefix_mean = total_organisation_size/float(num_prefixes)
         return per_prefix_mean
 
-    def get_flow_size(self):
+    def get_flow_size(self, random_state, size=None):
         # Choose size of entire organisation according to exponential distribution, then divide it by the number of
         # of prefixes of that organisation. Use this value as mean of a normal distribution to introduce some variance
         # amongst the different prefixes of that organisation.
 
-        flow_beta = 1000.0
-        flow_size = np.random.exponential(scale=flow_beta)
+        flow_size = random_state.exponential(scale=self.flow_size_beta, size=size)
         return flow_size
 
+    def get_additional_features(self, num_flows, random_state):
+        # draw the values of all additional features for a batch of flows at once, one row per flow. Each value follows
+        # an exponential distribution which is wrapped around the number of values of the respective feature.
+        limits = self.num_feature_values.astype(int)
+        values = random_state.exponential(scale=5, size=(num_flows, len(limits))).astype(int)
+        return values % limits
+
+    def get_path_id(self, path_entry):
+        # the path table of the current example, its ids are assigned in the order in which the paths are first used
+        path = path_entry[0]
+        if path not in self.path_ids:
+            self.path_ids[path] = len(self.path_table)
+            self.path_table.append(path_entry)
+        return self.path_ids[path]
+
+    def get_node_paths(self, closest_egresses, path_exceptions, num_multi_paths):
+        # the ids of the paths used from each node towards a prefix (or class of prefixes) given the closest egress of
+        # each node and the coins of the prefix
+        nodes = self.routing.nodes
+
+        node_paths = list()
+        for n, node in enumerate(nodes):
+            curr_egress = nodes[closest_egresses[n]]
+
+            # either shortest or not shortest path (if there is no longer path, use the shortest ones)
+            tmp_paths = list()
+            if path_exceptions[n]:
+                tmp_paths = self.routing.get_non_shortest_paths(node, curr_egress)
+            if not tmp_paths:
+                tmp_paths = self.routing.get_shortest_paths(node, curr_egress)
+
+            if not tmp_paths:
+                if curr_egress == node:
+                    tmp_paths = [self.routing.get_path_id([curr_egress], True)]
+                else:
+                    print 'THERE IS A PROBLEM WITH THE PATH FROM %s TO %s' % (node, curr_egress)
+
+            # if there are equal cost paths, use them
+            node_paths.append(tmp_paths[:num_multi_paths[n]])
+
+        return node_paths
+
+    def generate_organisation(self, seed, organisation, prefixes):
+        # create the flows of all nodes to all prefixes of an organisation. Every organisation draws from its own
+        # random state which is derived from the seed of the run, hence the result does not depend on the order in
+        # which (or the process by which) the organisations are processed. The flows are returned as arrays, the paths
+        # are given as index into the list of paths used by this organisation.
+        random_state = np.random.RandomState(seed)
+        nodes = self.routing.nodes
+
+        if self.aggregation == 'fec':
+            return self.generate_classes(random_state, organisation, prefixes)
+
+        # decide whether the node is multi-exit (hot-potato routing) or single exit
+        # aka pick the egresses
+        egress_nodes = self.get_egresses(random_state)
+
+        # get the mean size of each flow for this organisation
+        flow_mean = self.get_flow_mean(len(prefixes), random_state)
+
+        # draw all the coins for this organisation at once: the exceptions from the general egress behavior (one
+        # per prefix), the exceptions from shortest path routing (one per prefix and node) and the number of equal
+        # cost paths that are used. Continuing with the next equal cost path with probability multi_path_probability
+        # after each path is a geometric distribution.
+        batch_shape = (len(prefixes), len(nodes))
+        egress_exceptions = random_state.uniform(0, 1, len(prefixes)) < self.egress_exception_probability
+        path_exceptions = random_state.uniform(0, 1, batch_shape) < self.shortest_path_exception_probability
+        num_multi_paths = random_state.geometric(1.0 - self.multi_path_probability, batch_shape)
+
+        path_ids = list()
+        prefix_indices = list()
+        ingresses = list()
+        egresses = list()
+        prefix_egresses = list()
+        for p, prefix in enumerate(prefixes):
+            # introduce with some probability behavior which differs from the general organisation
+            if egress_exceptions[p]:
+                curr_egress_nodes = self.get_egresses(random_state)
+            else:
+                curr_egress_nodes = egress_nodes
+            prefix_egresses.append([self.routing.node_index[egress] for egress in curr_egress_nodes])
+
+            # check which is the closest egress node and then this is the path it takes
+            closest_egresses = self.routing.get_closest_egresses(curr_egress_nodes)
+
+            node_paths = self.get_node_paths(closest_egresses, path_exceptions[p], num_multi_paths[p])
+            for n, tmp_paths in enumerate(node_paths):
+                for path_id in tmp_paths:
+                    path_ids.append(path_id)
+                    prefix_indices.append(p)
+                    ingresses.append(n)
+                    egresses.append(closest_egresses[n])
+
+        # draw the additional features and the size of all flows of this organisation
+        additional_features = self.get_additional_features(len(path_ids), random_state)
+        flow_sizes = self.get_flow_size(random_state, len(path_ids))
+
+        used_paths, path_indices = np.unique(np.array(path_ids, dtype=int), return_inverse=True)
+
+        return {
+            'organisation': organisation,
+            'num_egresses': len(egress_nodes),
+            'organisation_size': flow_mean * len(prefixes),
+            'paths': [self.routing.paths[path_id] for path_id in used_paths],
+            'path_indices': path_indices,
+            'prefix_indices': np.array(prefix_indices, dtype=int),
+            'flow_sizes': flow_sizes,
+            'additional_features': additional_features,
+            'ingress_sizes': np.bincount(np.array(ingresses, dtype=int), weights=flow_sizes, minlength=len(nodes)),
+            'egress_sizes': np.bincount(np.array(egresses, dtype=int), weights=flow_sizes, minlength=len(nodes)),
+            'prefix_egresses': prefix_egresses,
+        }
+
+    def generate_classes(self, random_state, organisation, prefixes):
+        # same as generate_organisation, but the prefixes of the organisation are first grouped into forwarding
+        # equivalence classes by their egresses and the path coins are drawn once per class and node, hence all
+        # prefixes of a class use the same paths. The flows are ordered by class, prefix and path of the class.
+        nodes = self.routing.nodes
+
+        egress_nodes = self.get_egresses(random_state)
+        flow_mean = self.get_flow_mean(len(prefixes), random_state)
+
+        # the egresses of the class are sorted, such that ties between the closest egresses are broken the same way
+        # for all prefixes of the class
+        egress_exceptions = random_state.uniform(0, 1, len(prefixes)) < self.egress_exception_probability
+        class_ids = dict()
+        class_egresses = list()
+        class_prefixes = list()
+        prefix_classes = list()
+        for p in range(len(prefixes)):
+            curr_egress_nodes = self.get_egresses(random_state) if egress_exceptions[p] else egress_nodes
+            key = tuple(sorted(curr_egress_nodes))
+            if key not in class_ids:
+                class_ids[key] = len(class_ids)
+                class_egresses.append(list(key))
+                class_prefixes.append(list())
+            class_prefixes[class_ids[key]].append(p)
+            prefix_classes.append(class_ids[key])
+
+        batch_shape = (len(class_egresses), len(nodes))
+        path_exceptions = random_state.uniform(0, 1, batch_shape) < self.shortest_path_exception_probability
+        num_multi_paths = random_state.geometric(1.0 - self.multi_path_probability, batch_shape)
+
+        # the paths of each class (its rows) and the flows of each prefix of the class along these paths
+        row_path_ids = list()
+        row_classes = list()
+        path_ids = list()
+        prefix_indices = list()
+        ingresses = list()
+        egresses = list()
+        flow_rows = list()
+        for c, curr_egress_nodes in enumerate(class_egresses):
+            closest_egresses = self.routing.get_closest_egresses(curr_egress_nodes)
+            node_paths = self.get_node_paths(closest_egresses, path_exceptions[c], num_multi_paths[c])
+
+            rows = list()
+            for n, tmp_paths in enumerate(node_paths):
+                for path_id in tmp_paths:
+                    rows.append((len(row_path_ids), path_id, n, closest_egresses[n]))
+                    row_path_ids.append(path_id)
+                    row_classes.append(c)
+
+            for p in class_prefixes[c]:
+                for row, path_id, n, egress in rows:
+                    path_ids.append(path_id)
+                    prefix_indices.append(p)
+                    ingresses.append(n)
+                    egresses.append(egress)
+                    flow_rows.append(row)
+
+        # the additional features are drawn once per path of a class, the flow sizes once per flow
+        class_features = self.get_additional_features(len(row_path_ids), random_state)
+        flow_sizes = self.get_flow_size(random_state, len(path_ids))
+        flow_rows = np.array(flow_rows, dtype=int)
+
+        # traffic of each row for each prefix of its class, the flows of a class form a (prefixes x rows) block
+        class_traffic = list()
+        class_num_rows = np.bincount(np.array(row_classes, dtype=int), minlength=len(class_prefixes))
+        start = 0
+        for class_prefix_indices, num_rows in zip(class_prefixes, class_num_rows):
+            block = flow_sizes[start:start + len(class_prefix_indices) * num_rows]
+            class_traffic.extend(block.reshape(len(class_prefix_indices), num_rows).T.tolist())
+            start += len(block)
+
+        used_paths, path_indices = np.unique(np.array(path_ids, dtype=int), return_inverse=True)
+
+        return {
+            'organisation': organisation,
+            'num_egresses': len(egress_nodes),
+            'organisation_size': flow_mean * len(prefixes),
+            'paths': [self.routing.paths[path_id] for path_id in used_paths],
+            'path_indices': path_indices,
+            'prefix_indices': np.array(prefix_indices, dtype=int),
+            'flow_sizes': flow_sizes,
+            'additional_features': class_features[flow_rows],
+            'ingress_sizes': np.bincount(np.array(ingresses, dtype=int), weights=flow_sizes, minlength=len(nodes)),
+            'egress_sizes': np.bincount(np.array(egresses, dtype=int), weights=flow_sizes, minlength=len(nodes)),
+            'prefix_egresses': [[self.routing.node_index[egress] for egress in class_egresses[prefix_classes[p]]]
+                                for p in range(len(prefixes))],
+            'class_prefixes': class_prefixes,
+            'row_classes': row_classes,
+            'row_path_indices': np.searchsorted(used_paths, np.array(row_path_ids, dtype=int)),
+            'class_features': class_features,
+            'class_traffic': class_traffic,
+        }
+
+    def imap_organisations(self, tasks):
+        # generates the organisations in the worker pool and yields the results in the order of the tasks. The tasks
+        # are submitted in batches and at most two batches per worker are submitted before the oldest one is consumed,
+        # such that the finished organisations do not pile up if writing the chunks is slower than generating them.
+        batch_size = max(1, len(tasks) // (16 * self.workers))
+        pending = deque()
+        for start in xrange(0, len(tasks), batch_size):
+            if len(pending) >= 2 * self.workers:
+                for result in pending.popleft().get():
+                    yield result
+            batch = tasks[start:start + batch_size]
+            pending.append(self.pool.map_async(generate_organisation, batch, len(batch)))
+
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+
     def get_paths(self):
+        # generator which yields the flows in chunks of chunk_size
         paths = list()
 
+        self.path_table = list()
+        self.path_ids = dict()
+
+        # forwarding equivalence classes as (organisation, prefixes) and their paths as (path id, class id, traffic,
+        # features)
+        self.fec_classes = list()
+        self.fec_paths = list()
+
+        # egresses (node indices) of each prefix in the order in which they are used to break ties
+        self.prefix_egresses = list()
+
         i = 0
         j = 0
         k = 0
 
         additional_feature_values = defaultdict(set)
 
-        print 'start computing all the paths'
-        for organisation, prefixes in self.organisation_to_prefix.iteritems():
-            # decide whether the node is multi-exit (hot-potato routing) or single exit
-            # aka pick the egresses
-            egress_nodes = self.get_egresses()
-            self.stats['num_egresses'].append(len(egress_nodes))
+        nodes = self.routing.nodes
+
+        tasks = [((self.seed, self.run_index, organisation_index), organisation, prefixes)
+                 for organisation_index, (organisation, prefixes)
+                 in enumerate(sorted(self.organisation_to_prefix.iteritems()))]
 
-            # get the mean size of each flow for this organisation
-            flow_mean = self.get_flow_mean(len(prefixes))
+        print 'start computing all the paths'
+        if self.pool:
+            results = self.imap_organisations(tasks)
+        else:
+            results = itertools.imap(generate_organisation, tasks)
 
+        for (_, organisation, prefixes), result in itertools.izip(tasks, results):
+            i += len(prefixes) * len(nodes)
             j += 1
-            for prefix in prefixes:
-                # introduce with some probability behavior which differs from the general organisation
-                if random.uniform(0, 1) < self.egress_exception_probability:
-                    curr_egress_nodes = self.get_egresses()
-                else:
-                    curr_egress_nodes = egress_nodes
-                k += 1
-
-                for node in nx.nodes(self.graph):
-                    # check which is the closest egress node and then this is the path it takes
-                    length = 1000
-                    curr_egress = ''
-                    for egress_node in curr_egress_nodes:
-                        if self.shortest_path_lengths[node][egress_node] < length:
-                            curr_egress = egress_node
-                            length = self.shortest_path_lengths[node][egress_node]
-
-                    # either shortest or not shortest path
-                    if random.uniform(0, 1) < self.shortest_path_exception_probability:
-                        tmp_paths = self.non_shortest_paths[node][curr_egress]
-                    else:
-                        tmp_paths = self.shortest_paths[node][curr_egress]
-
-                    if not tmp_paths:
-                        if curr_egress == node:
-                            tmp_paths = [[curr_egress]]
-                        else:
-                            print 'THERE IS A PROBLEM WITH THE PATH FROM %s TO %s' % (node, curr_egress)
-
-                    # if there are equal cost paths, use them
-                    for path in tmp_paths:
-                        additional_features = list()
-                        for q, limit in enumerate(self.num_feature_values):
-                            value = int(np.random.exponential(scale=5)) % int(limit)
-                            additional_features.append(value)
-                            additional_feature_values[q].add(value)
-
-                        # get the size of this flow
-                        # flow_size = np.random.normal(loc=flow_mean)
-                        flow_size = self.get_flow_size()
-                        self.stats['organisation_size2'][organisation] += flow_size
-                        self.stats['egress_size'][curr_egress] += flow_size
-                        self.stats['ingress_size'][node] += flow_size
-                        paths.append((path, organisation, prefix, flow_size, additional_features))
-
-                        if random.uniform(0, 1) > self.multi_path_probability:
-                            break
-
-                    i += 1
+            k += len(prefixes)
+
+            self.stats.add('num_egresses', result['num_egresses'])
+            self.stats.add('organisation_size', result['organisation_size'])
+
+            # map the paths of the organisation to the path table in the order in which they are first used
+            _, first_uses = np.unique(result['path_indices'], return_index=True)
+            path_ids = np.zeros(len(result['paths']), dtype=int)
+            for path_index in result['path_indices'][np.sort(first_uses)]:
+                path_ids[path_index] = self.get_path_id(result['paths'][path_index])
+
+            if 'class_prefixes' in result:
+                class_offset = len(self.fec_classes)
+                for class_prefix_indices in result['class_prefixes']:
+                    self.fec_classes.append((organisation, [prefixes[p] for p in class_prefix_indices]))
+                for path_id, row_class, traffic, features in itertools.izip(
+                        path_ids[result['row_path_indices']].tolist(), result['row_classes'],
+                        result['class_traffic'], result['class_features'].tolist()):
+                    if self.fec_traffic == 'sum':
+                        traffic = sum(traffic)
+                    self.fec_paths.append((path_id, class_offset + row_class, traffic, features))
+
+            for prefix, egresses in zip(prefixes, result['prefix_egresses']):
+                self.prefix_egresses.append((prefix, egresses))
+
+            additional_features = result['additional_features']
+            flow_sizes = result['flow_sizes']
+
+            for q in range(additional_features.shape[1]):
+                additional_feature_values[q].update(np.unique(additional_features[:, q]).tolist())
+
+            for path_id, prefix_index, flow_size, features in itertools.izip(path_ids[result['path_indices']].tolist(),
+                                                                             result['prefix_indices'].tolist(),
+                                                                             flow_sizes.tolist(),
+                                                                             additional_features.tolist()):
+                paths.append((path_id, organisation, prefixes[prefix_index], flow_size, features))
+
+            if len(flow_sizes):
+                self.stats.add('organisation_size2', flow_sizes.sum())
+                self.stats.update('flow_size', flow_sizes)
+                self.stats.add_node_traffic('ingress_size', result['ingress_sizes'])
+                self.stats.add_node_traffic('egress_size', result['egress_sizes'])
+
+            while len(paths) >= self.chunk_size:
+                yield paths[:self.chunk_size]
+                paths = paths[self.chunk_size:]
 
         print 'i: %d, j: %d, k: %d' % (i, j, k)
 
@@ -463,7 +852,8 @@ class ExampleGenerator(object):
         for q, values in additional_feature_values.iteritems():
             print '%d' % (len(values), )
 
-        return paths
+        if paths:
+            yield paths
 
     def create_grammar_mappings(self, output_path):
         with open('%s/destinations.grammar' % output_path, 'w') as outfile:
@@ -477,38 +867,17 @@ class ExampleGenerator(object):
                 outfile.write('(rule $Hop (%s) (ConstantFn (string %s)))\n' % (name.lower(), str(node)))
 
     def produce_stats(self, output_path):
-        num_plots = len(self.stats)
-        cols = 3
-        rows = int(math.ceil(num_plots/3.0))
-
-        fig, axes = plt.subplots(cols, rows, sharex=False, sharey=True)
-
-        print 'N-%d, R-%d, C-%d, 1-%d 2-%d' % (num_plots, rows, cols, len(axes), len(axes[0]))
-
-        i = 0
-        for name, stats in self.stats.iteritems():
-            col = int(i/rows)
-            row = i % rows
-
-            ax = axes[col, row]
-
-            if isinstance(stats, dict):
-                stats = stats.values()
-
-            min_value = np.floor(min(stats))
-            max_value = np.ceil(max(stats))
-            value_range = (min_value - 0.1, max_value + 0.1)
+        # write the statistics and plot them in the background, the generation of the next example does not wait for it
+        self.stats.write(output_path)
 
-            num_bins = 1000
-            p1 = ax.hist(stats, range=value_range, bins=num_bins, normed=1, histtype='step', cumulative='True')
+        if self.plots:
+            plot_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot_stats.py')
+            self.plot_processes.append((output_path, subprocess.Popen([sys.executable, plot_script, output_path])))
 
-            ax.set_title('CDF: %s' % name.replace('_', ' '))
-            ax.set_ylim(0, 1)
-            ax.set_xlim(min_value, max_value)
-            i += 1
 
-        plt.tight_layout(pad=0.4, w_pad=0.5, h_pad=1.0)
-        plt.savefig('%s/cdfs.pdf' % (output_path, ), bbox_inches='tight')
+def parse_egresses(value):
+    # number of egresses or, if it contains a decimal point, fraction of the nodes
+    return float(value) if '.' in value else int(value)
 
 
 if __name__ == "__main__":
@@ -517,6 +886,36 @@ if __name__ == "__main__":
     parser.add_argument('output_path', help='path to the directory where the output should be stored', type=str)
     parser.add_argument('-a', '--automatically', help='automatically generate names and pick egresses', action='store_true')
     parser.add_argument('-d', '--debug', help='enable debug output', action='store_true')
+    parser.add_argument('-s', '--seed', help='seed for all random decisions to make the run reproducible', type=int)
+    parser.add_argument('-f', '--formats', help='output formats to write', nargs='+',
+                        choices=['dump', 'columns', 'stream', 'rollup', 'shards'], default=['dump', 'columns', 'rollup'])
+    parser.add_argument('-c', '--chunk-size', help='number of flows which are generated and written at once',
+                        type=int, default=100000)
+    parser.add_argument('-w', '--workers', help='number of worker processes generating the flows', type=int, default=1)
+    parser.add_argument('--cache-dir', help='directory where the parsed input files are cached', type=str,
+                        default='.ndb_cache')
+    parser.add_argument('--aggregation', help='route each prefix on its own or all prefixes of a forwarding '
+                                              'equivalence class together and write the classes to ndb_fec.out '
+                                              'instead of the dump (the other formats contain the expanded flows)',
+                        choices=['flows', 'fec'], default='flows')
+    parser.add_argument('--fec-traffic', help='keep the traffic of each prefix of a class or only their sum',
+                        choices=['prefix', 'sum'], default='prefix')
+    parser.add_argument('-e', '--epochs', help='number of epochs of traffic over the same flows', type=int)
+    parser.add_argument('--epoch-correlation', help='correlation of the traffic of a flow between consecutive epochs',
+                        type=float, default=0.0)
+    parser.add_argument('--no-plots', help='only write the statistics, do not plot them to cdfs.pdf',
+                        action='store_true')
+    parser.add_argument('-n', '--num-prefixes', help='number of prefixes of each example to generate (0 for all)',
+                        type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('-g', '--egresses', help='number (e.g., 8) or fraction of the nodes (e.g., 0.3) which are '
+                                                 'picked as egresses with --automatically', type=parse_egresses)
+    parser.add_argument('--organisations', help='ASN to organisation mapping', type=str, default='as_to_org.txt')
+    parser.add_argument('--rib', help='full RIB whose prefixes are used', type=str, default='full-ipv4-rib.out')
+    parser.add_argument('--pipeline-depth', help='number of examples which are written in the background while the '
+                                                 'next one is generated (0 to write each example before the next one)',
+                        type=int, default=1)
+    parser.add_argument('--profile', help='profile each phase with cProfile and write the statistics to this directory',
+                        type=str)
     parsed_args = parser.parse_args()
 
     loglevel = 'DEBUG' if parsed_args.debug else 'INFO'
@@ -531,4 +930,20 @@ if __name__ == "__main__":
 
     example_generator = ExampleGenerator(graph_file,
                                          output_path,
-                                         automatically)
+                                         automatically,
+                                         seed=parsed_args.seed,
+                                         formats=parsed_args.formats,
+                                         chunk_size=parsed_args.chunk_size,
+                                         workers=parsed_args.workers,
+                                         cache_dir=parsed_args.cache_dir,
+                                         aggregation=parsed_args.aggregation,
+                                         fec_traffic=parsed_args.fec_traffic,
+                                         epochs=parsed_args.epochs,
+                                         epoch_correlation=parsed_args.epoch_correlation,
+                                         plots=not parsed_args.no_plots,
+                                         profile_dir=parsed_args.profile,
+                                         num_prefixes=parsed_args.num_prefixes,
+                                         num_egresses=parsed_args.egresses,
+                                         organisation_file=parsed_args.organisations,
+                                         rib_file=parsed_args.rib,
+                                         pipeline_depth=parsed_args.pipeline_depth)
@@ -7,10 +7,14 @@ Script to quickly analyze a generated example (number of prefixes, paths, and pr
 
 
 import argparse
+import os
 import pickle
-import re
+import sys
 
-import networkx as nx
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from ndb_index import NDBIndex
+from ndb_rollup import ROLLUP_FILE, load_rollup
+from ndb_topology import load_topology
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -27,13 +31,18 @@ if __name__ == "__main__":
     topo_file = parsed_args.topo
 
     # read data from file
-    with open('%s/%s' % (input_path, data_file), 'r') as infile:
+    with open('%s/%s' % (input_path, data_file), 'rb') as infile:
         data = pickle.load(infile)
 
     destination_to_prefix = data['destination_to_prefix']
     prefix_to_destination = data['prefix_to_destination']
     paths = data['paths']
 
+    # the flows refer to their path by its id in the path table, older dumps contain the paths themselves
+    if 'path_table' in data:
+        path_table = data['path_table']
+        paths = [(path_table[path[0]][0], ) + tuple(path[1:]) for path in paths]
+
     # GENERAL INFORMATION ABOUT THE FORWARDING STATE
     print 'There are %d paths for %d destinations with a total of %d prefixes' % \
           (len(paths), len(destination_to_prefix), len(prefix_to_destination))
@@ -45,7 +54,7 @@ if __name__ == "__main__":
             # print str(prefixes)
 
     # GENERAL INFORMATION ABOUT THE UNDERLYING TOPOLOGY
-    topo = nx.read_gpickle('%s/%s' % (input_path, topo_file))
+    topo = load_topology(input_path, topo_file)
     print 'The graph has %d nodes and %d edges' % (topo.number_of_nodes(), topo.number_of_edges())
 
     # COMPUTE SCORE OF THE DIFFERENT SPECS (specified below in all_fvs)
@@ -55,35 +64,25 @@ if __name__ == "__main__":
                    [('egress', 2), ('destination', 'Hydro One Telecom Inc.')],
                    [('egress', 2), ('destination', 'Hydro One Telecom Inc.'), ('ingress', 6)]]
 
-        for feature_values in all_fvs:
-            traffic = 0
-            num_paths = 0
-            for path in paths:
-                matches = True
-
-                for feature, value in feature_values:
-                    if feature == 'egress' and str(value) != path[0][-1]:
-                        matches = False
-                        break
+        # build the index once, afterwards each spec only touches the paths matching its most selective feature value
+        index = NDBIndex([path[3] for path in paths])
+        index.add_values('ingress', [path[0][0] for path in paths])
+        index.add_values('egress', [path[0][-1] for path in paths])
+        index.add_values('destination', [path[1] for path in paths])
 
-                    if feature == 'ingress' and str(value) != path[0][0]:
-                        matches = False
-                        break
-
-                    if feature == 'destination' and re.sub('[^a-zA-Z0-9]', '', str(value)) != re.sub('[^a-zA-Z0-9]', '', path[1]):
-                        matches = False
-                        break
-
-                if matches:
-                    traffic += path[3]
-                    num_paths += 1
+        for feature_values in all_fvs:
+            traffic, num_paths = index.query(feature_values)
 
             print 'TRAFFIC %f FOR %s WITH %d PATHS' % (traffic, feature_values, num_paths)
 
     if True:
-        egresses = set()
-        for path in paths:
-            egresses.add(path[0][-1])
+        # the rollup written by the generator already contains the traffic per egress
+        if os.path.exists(os.path.join(input_path, ROLLUP_FILE)):
+            egresses = set(egress for (egress, ) in load_rollup(input_path).get_group('egress'))
+        else:
+            egresses = set()
+            for path in paths:
+                egresses.add(path[0][-1])
 
         print 'THERE ARE %d EGRESSES' % (len(egresses), )
         print ', '.join([str(x) for x in list(egresses)])
@@ -2,13 +2,38 @@
 # Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
 
 """
-Script to quickly analyze all the topology zoo topologies (number of nodes and edges)
+Script to quickly analyze all the topology zoo topologies (number of nodes and edges). The topologies are compiled in
+parallel and cached (see ndb_topology), such that later runs only read the cached topologies.
 """
 
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from ndb_topology import load_graphml
+
+
+def get_size(task):
+    # number of nodes and edges of a topology, None if the file does not exist
+    graph_file, cache_dir = task
+    if not os.path.exists(graph_file):
+        return None
+    topology = load_graphml(graph_file, cache_dir)
+    return os.path.basename(graph_file), topology.number_of_nodes(), topology.number_of_edges()
 
-import networkx as nx
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--directory', help='directory containing the topology zoo graphml files', type=str,
+                        default='.')
+    parser.add_argument('-w', '--workers', help='number of worker processes compiling the topologies', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--cache-dir', help='directory where the compiled topologies are cached', type=str,
+                        default='.ndb_cache')
+    parser.add_argument('-t', '--top', help='number of largest topologies to print', type=int, default=10)
+    parsed_args = parser.parse_args()
 
     graph_files = ['Aarnet.graphml', 'BeyondTheNetwork.graphml', 'Deltacom.graphml', 'Garr201007.graphml', 'GtsSlovakia.graphml',
                    'KentmanApr2007.graphml', 'Packetexchange.graphml', 'Sunet.graphml', 'Abilene.graphml', 'Bics.graphml',
@@ -62,15 +87,13 @@ if __name__ == "__main__":
                    'GtsRomania.graphml', 'Kdl.graphml', 'Pacificwave.graphml', 'Sprint.graphml'
     ]
 
-    networks = list()
-    for graph_file in graph_files:
-        # load graph from file
-        graph = nx.read_graphml(graph_file)
-        networks.append((graph_file, graph.number_of_nodes(), graph.number_of_edges()))
+    tasks = [(os.path.join(parsed_args.directory, graph_file), parsed_args.cache_dir) for graph_file in graph_files]
+    pool = multiprocessing.Pool(max(1, parsed_args.workers))
+    networks = [network for network in pool.map(get_size, tasks) if network]
+    pool.close()
+    pool.join()
+
+    print 'FOUND %d OF %d TOPOLOGIES' % (len(networks), len(graph_files))
 
-    i = 0
-    for graph_file, num_nodes, num_edges in sorted(networks, key=lambda x: x[1], reverse=True):
-        i += 1
+    for graph_file, num_nodes, num_edges in sorted(networks, key=lambda x: x[1], reverse=True)[:parsed_args.top]:
         print '%s: Nodes %d, Edges %d' % (graph_file, num_nodes, num_edges)
-        if i > 10:
-            break
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Script to render the CDFs of the statistics of a generated example (ndb_stats.json) to cdfs.pdf. The generator runs it
+in a background process after each example, it can also be run on its own.
+"""
+
+import argparse
+import math
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+
+from matplotlib import rc_file
+
+from stats_sketch import load_stats
+
+
+def plot_stats(example_path):
+    stats = load_stats(example_path)
+
+    num_plots = len(stats)
+    cols = 3
+    rows = int(math.ceil(num_plots/3.0))
+
+    fig, axes = plt.subplots(cols, rows, sharex=False, sharey=True, squeeze=False)
+
+    for i, name in enumerate(sorted(stats)):
+        col = int(i/rows)
+        row = i % rows
+
+        ax = axes[col, row]
+
+        cdf = stats[name]['cdf']
+        if cdf['values']:
+            values = [stats[name]['min']] + cdf['values']
+            probabilities = [0.0] + cdf['probabilities']
+            ax.plot(values, probabilities, drawstyle='steps-post')
+            ax.set_xlim(values[0], values[-1])
+
+        ax.set_title('CDF: %s' % name.replace('_', ' '))
+        ax.set_ylim(0, 1)
+
+    plt.tight_layout(pad=0.4, w_pad=0.5, h_pad=1.0)
+    plt.savefig(os.path.join(example_path, 'cdfs.pdf'), bbox_inches='tight')
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parsed_args = parser.parse_args()
+
+    if os.path.exists('matplotlibrc'):
+        rc_file('matplotlibrc')
+
+    plot_stats(parsed_args.path)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Cache for the parsed input files (full-ipv4-rib.out and as_to_org.txt). Each input is parsed only once into a compact
+binary file which is reused as long as the path, size and modification time of the input stay the same.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+
+import numpy as np
+
+
+def get_cache_file(cache_dir, input_file):
+    stat = os.stat(input_file)
+    key = hashlib.sha1('%s|%d|%d' % (os.path.abspath(input_file), stat.st_size, int(stat.st_mtime))).hexdigest()
+    return os.path.join(cache_dir, '%s-%s.cache' % (os.path.basename(input_file), key))
+
+
+def load_cached(input_file, cache_dir, parse):
+    # returns parse(input_file), the result is stored in the cache directory and read from there as long as the input
+    # file does not change. Without a cache directory, the file is always parsed.
+    if not cache_dir:
+        return parse(input_file)
+
+    cache_file = get_cache_file(cache_dir, input_file)
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as infile:
+            return pickle.load(infile)
+
+    result = parse(input_file)
+
+    # write to a temporary file first, such that concurrent runs never read a partially written cache
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    with open(tmp_file, 'wb') as outfile:
+        pickle.dump(result, outfile, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_file, cache_file)
+
+    return result
+
+
+def parse_rib(rib_file):
+    # returns the prefixes and the origin ASN of each prefix as arrays, in the order of the RIB
+    prefixes = list()
+    origins = list()
+    with open(rib_file, 'r') as infile:
+        for line in infile:
+            tmp_data = line.strip().split(' ')
+            prefix = tmp_data[0]
+
+            # deal with AS sets
+            if '{' in tmp_data[-1]:
+                origin = int(tmp_data[-1].replace('{', '').replace('}', '').split(',')[0])
+            else:
+                origin = int(tmp_data[-1])
+
+            prefixes.append(prefix)
+            origins.append(origin)
+
+    return np.array(prefixes), np.array(origins, dtype=np.int64)
+
+
+def parse_organisations(org_file):
+    # load organisations and their prefixes from the file
+    asn_to_org_id = dict()
+    org_id_to_name = dict()
+
+    names = list()
+
+    with open(org_file, 'r') as infile:
+        mode = -1
+        for tmp_line in infile:
+            line = tmp_line.strip()
+            if line.startswith('#'):
+                if line.startswith('# format:org_id'):
+                    mode = 1
+                elif line.startswith('# format:aut'):
+                    mode = 2
+            else:
+                if mode == -1:
+                    print 'NOT READY - NO FORMAT DEFINITION'
+                    sys.exit(0)
+                elif mode == 1:
+                    # format:org_id|changed|org_name|country|source
+                    org_id, _, org_name, _, _ = line.split('|')
+                    org_id_to_name[org_id] = org_name
+                    names.append(org_name)
+                elif mode == 2:
+                    # format:aut|changed|aut_name|org_id|source
+                    tmp_asn, _, _, org_id, _ = line.split('|')
+                    asn = int(tmp_asn)
+                    asn_to_org_id[asn] = org_id
+
+    asn_to_name = dict()
+    for asn, org_id in asn_to_org_id.iteritems():
+        asn_to_name[asn] = org_id_to_name[org_id]
+
+    return asn_to_name, names
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Routing state of a topology: shortest path DAGs and dense shortest path distances between all nodes, the equal cost
+paths and some slightly longer paths (detours) between any two nodes and the hot-potato egress selection. The routing
+state after some links or nodes failed is derived from the state before the failure by only repeating the shortest path
+computations of the sources which were affected.
+"""
+
+from collections import OrderedDict
+import itertools
+
+import networkx as nx
+import numpy as np
+
+
+class BoundedCache(object):
+    # dict-like cache which holds at most max_size entries and evicts the least recently used one
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getitem__(self, key):
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.entries:
+            del self.entries[key]
+        elif len(self.entries) >= self.max_size:
+            self.entries.popitem(last=False)
+        self.entries[key] = value
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Routing(object):
+    def __init__(self, graph, detour_slack=1, max_detours=10, detour_cache_size=10000, sources=None, nodes=None):
+        # the shortest paths are only computed from the given sources (all nodes if None), see get_failure_routing
+        self.graph = graph
+
+        # fix an order of the nodes, all node indices refer to this order. The order can be given, such that the
+        # indices of a failure routing are the same as those of the routing before the failure (the order of the nodes
+        # of a copied graph can differ from the original one).
+        self.nodes = list(nodes) if nodes is not None else nx.nodes(graph)
+        self.node_index = dict((node, index) for index, node in enumerate(self.nodes))
+
+        # neighbors of each node together with the weight of the link
+        self.neighbors = [dict() for _ in self.nodes]
+        for n1, n2, data in graph.edges_iter(data=True):
+            i1 = self.node_index[n1]
+            i2 = self.node_index[n2]
+            weight = data.get('weight', 1)
+            self.neighbors[i1][i2] = min(weight, self.neighbors[i1].get(i2, weight))
+            if not graph.is_directed():
+                self.neighbors[i2][i1] = self.neighbors[i1][i2]
+
+        # run one shortest path computation per source which gives the dense matrix with the length of the shortest
+        # path between any two nodes (inf if there is none) and the predecessors of each node on all shortest paths
+        # from the source (shortest path DAG)
+        self.distances = np.full((len(self.nodes), len(self.nodes)), np.inf)
+        self.predecessors = [dict() for _ in self.nodes]
+        for source in (self.nodes if sources is None else sources):
+            predecessors, lengths = nx.dijkstra_predecessor_and_distance(graph, source)
+            self.predecessors[self.node_index[source]] = predecessors
+            for target, length in lengths.iteritems():
+                self.distances[self.node_index[source], self.node_index[target]] = length
+
+        # path table: each path which is used is stored once as (path, ingress, egress, length, is shortest path) and
+        # referred to by its id
+        self.paths = list()
+        self.path_ids = dict()
+
+        # (source, target) -> ids of all shortest paths, only filled for the pairs which are actually used
+        self.shortest_paths = dict()
+
+        # (source, target) -> ids of up to max_detours paths which are at most detour_slack longer than the shortest path.
+        # As there are many more of them, only the recently used ones are kept.
+        self.detour_slack = detour_slack
+        self.max_detours = max_detours
+        self.non_shortest_paths = BoundedCache(detour_cache_size)
+
+        # egress set -> closest egress of each node
+        self.closest_egresses = dict()
+
+    def get_failure_routing(self, failed_links=(), failed_nodes=()):
+        # returns the routing state of the same topology after the given links (pairs of nodes) and nodes failed. A
+        # failed node loses all its links but keeps its index. The shortest path DAG and distances of a source are
+        # only recomputed if its DAG contained a failed link, otherwise they do not change (except that failed nodes are
+        # no longer reachable).
+        graph = self.graph.copy()
+        failed_nodes = set(failed_nodes)
+
+        removed_links = set()
+        for n1, n2 in itertools.chain(failed_links, ((node, neighbor) for node in failed_nodes
+                                                     for neighbor in self.graph.neighbors(node))):
+            removed_links.add((n1, n2))
+            if not graph.is_directed():
+                removed_links.add((n2, n1))
+        for n1, n2 in removed_links:
+            while graph.has_edge(n1, n2):
+                graph.remove_edge(n1, n2)
+
+        # links into a failed node only matter for the distance to that node
+        affected_sources = list()
+        for source, predecessors in zip(self.nodes, self.predecessors):
+            if source in failed_nodes or any((predecessor, target) in removed_links
+                                             for target, target_predecessors in predecessors.iteritems()
+                                             if target not in failed_nodes
+                                             for predecessor in target_predecessors):
+                affected_sources.append(source)
+
+        routing = Routing(graph, self.detour_slack, self.max_detours, self.non_shortest_paths.max_size,
+                          sources=affected_sources, nodes=self.nodes)
+        affected = set(routing.node_index[source] for source in affected_sources)
+        failed = [routing.node_index[node] for node in failed_nodes]
+        for index, predecessors in enumerate(self.predecessors):
+            if index not in affected:
+                routing.distances[index] = self.distances[index]
+                routing.distances[index, failed] = np.inf
+                routing.predecessors[index] = dict((target, target_predecessors) for target, target_predecessors
+                                                   in predecessors.iteritems() if target not in failed_nodes)
+        routing.affected_sources = affected_sources
+
+        return routing
+
+    def get_closest_egresses(self, egress_nodes):
+        # returns for each node the index of the closest of the given egress nodes (hot-potato routing). In case of a
+        # tie, the egress which comes first in egress_nodes is chosen.
+        key = tuple(self.node_index[egress_node] for egress_node in egress_nodes)
+        if key not in self.closest_egresses:
+            egress_ids = np.array(key)
+            self.closest_egresses[key] = egress_ids[np.argmin(self.distances[:, egress_ids], axis=1)]
+        return self.closest_egresses[key]
+
+    def get_path_id(self, path, shortest_path):
+        path = tuple(path)
+        if path not in self.path_ids:
+            self.path_ids[path] = len(self.paths)
+            self.paths.append((path, path[0], path[-1], len(path) - 1, shortest_path))
+        return self.path_ids[path]
+
+    def get_shortest_paths(self, source, target):
+        # returns the ids of all equal cost shortest paths from source to target by walking the shortest path DAG of the
+        # source backwards from the target
+        key = (source, target)
+        if key not in self.shortest_paths:
+            predecessors = self.predecessors[self.node_index[source]]
+
+            paths = list()
+            if target in predecessors:
+                stack = [[target]]
+                while stack:
+                    reverse_path = stack.pop()
+                    if reverse_path[-1] == source:
+                        paths.append(reverse_path[::-1])
+                    else:
+                        for predecessor in predecessors[reverse_path[-1]]:
+                            stack.append(reverse_path + [predecessor])
+
+            self.shortest_paths[key] = [self.get_path_id(path, True) for path in paths]
+        return self.shortest_paths[key]
+
+    def get_non_shortest_paths(self, source, target):
+        # returns the ids of simple paths from source to target which are longer than the shortest path by at most
+        # detour_slack.
+        # The search only extends a partial path to a neighbor if the distance from that neighbor to the target still
+        # allows to reach it within the bound, hence it never explores paths which are too long.
+        key = (source, target)
+        if key not in self.non_shortest_paths:
+            s = self.node_index[source]
+            t = self.node_index[target]
+            shortest_length = self.distances[s, t]
+            max_length = shortest_length + self.detour_slack + 1e-9
+
+            detours = list()
+            if shortest_length < np.inf:
+                stack = [(s, 0, [s])]
+                while stack and len(detours) < self.max_detours:
+                    node, length, path = stack.pop()
+                    if node == t:
+                        if length > shortest_length + 1e-9:
+                            detours.append((length, path))
+                        continue
+
+                    for neighbor, weight in self.neighbors[node].iteritems():
+                        if length + weight + self.distances[neighbor, t] <= max_length and neighbor not in path:
+                            stack.append((neighbor, length + weight, path + [neighbor]))
+
+            self.non_shortest_paths[key] = [self.get_path_id([self.nodes[i] for i in path], False)
+                                            for _, path in sorted(detours)]
+        return self.non_shortest_paths[key]
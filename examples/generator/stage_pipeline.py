@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Pipeline which runs the stages of the example generator that only write files (the dump, the topology, config.json and
+metrics.json) in background processes, such that the flows of the next example are generated while the previous example
+is written. The processes are forked and hence see the state of the generator at the time the stage is submitted
+without copying or pickling it.
+
+At most depth stages are pending at once, before another one is started the oldest one is waited for. This bounds the
+number of examples which are held in memory at the same time. An exception in a stage is raised again in the generator
+as StageError with the traceback of the stage, the stages which are still pending are then terminated.
+"""
+
+import multiprocessing
+import traceback
+
+
+class StageError(Exception):
+    pass
+
+
+def run_stage(connection, function, args):
+    # runs in the forked process and sends None or the traceback of the exception raised by the stage
+    try:
+        function(*args)
+    except BaseException:
+        connection.send(traceback.format_exc())
+    else:
+        connection.send(None)
+    finally:
+        connection.close()
+
+
+class StagePipeline(object):
+    def __init__(self, depth=1):
+        # with depth 0, each stage runs in this process as soon as it is submitted
+        self.depth = depth
+        self.pending = list()
+
+    def wait_for_slot(self):
+        # blocks until another stage can be started without exceeding the depth
+        while self.pending and len(self.pending) >= self.depth:
+            self.wait_oldest()
+
+    def submit(self, name, function, *args):
+        if not self.depth:
+            function(*args)
+            return
+
+        self.wait_for_slot()
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=run_stage, args=(sender, function, args), name=name)
+        process.start()
+        # only the stage holds the sending end, such that receiving fails if its process dies without sending
+        sender.close()
+        self.pending.append((name, process, receiver))
+
+    def wait_oldest(self):
+        # waits for the oldest stage. If it failed (or waiting for it is interrupted), all pending stages are terminated.
+        name, process, receiver = self.pending[0]
+        error = None
+        completed = False
+        try:
+            try:
+                error = receiver.recv()
+            except EOFError:
+                pass
+            process.join()
+            completed = True
+        finally:
+            if not completed:
+                self.terminate()
+
+        if error is None and process.exitcode:
+            error = 'THE PROCESS EXITED WITH CODE %d' % (process.exitcode, )
+        if error is not None:
+            self.terminate()
+            raise StageError('STAGE %s FAILED:\n%s' % (name, error))
+
+        self.pending.pop(0)
+        receiver.close()
+
+    def join(self):
+        # waits for all pending stages, the first failed stage is raised
+        while self.pending:
+            self.wait_oldest()
+
+    def terminate(self):
+        # terminates and joins all pending stages
+        for _, process, receiver in self.pending:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
+        self.pending = list()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Streaming statistics of the generator. The distribution of each metric is kept in a quantile sketch of fixed size:
+the values are counted in logarithmically spaced buckets, such that each quantile is known up to a relative error of
+relative_accuracy, independent of the number of values. The sketches are updated in batches and written together with
+the traffic per ingress and egress node to ndb_stats.json, from which plot_stats.py renders the CDFs.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+STATS_FILE = 'ndb_stats.json'
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+class QuantileSketch(object):
+    # values below min_value are counted as min_value, values above max_value as max_value
+    def __init__(self, relative_accuracy=0.01, min_value=1e-3, max_value=1e12, buffer_size=1024):
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.offset = int(math.floor(math.log(min_value) / self.log_gamma))
+        self.buckets = np.zeros(int(math.ceil(math.log(max_value) / self.log_gamma)) - self.offset + 1, dtype=np.int64)
+
+        self.count = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+        # single values are collected and added in batches
+        self.buffer = list()
+        self.buffer_size = buffer_size
+
+    def add(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+
+        self.count += len(values)
+        self.sum += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        indices = np.ceil(np.log(np.maximum(values, self.min_value)) / self.log_gamma).astype(np.int64) - self.offset
+        self.buckets += np.bincount(np.clip(indices, 0, len(self.buckets) - 1), minlength=len(self.buckets))
+
+    def flush(self):
+        if self.buffer:
+            self.update(self.buffer)
+            self.buffer = list()
+
+    def get_cdf(self):
+        # upper bound of each non-empty bucket and the fraction of values up to it
+        self.flush()
+        if not self.count:
+            return list(), list()
+        indices = np.flatnonzero(self.buckets)
+        values = np.clip(self.gamma ** (indices + self.offset), self.min, self.max)
+        return values.tolist(), (np.cumsum(self.buckets[indices]) / float(self.count)).tolist()
+
+    def get_quantile(self, q):
+        self.flush()
+        if not self.count:
+            return None
+        cumulative = np.cumsum(self.buckets)
+        index = int(np.searchsorted(cumulative, q * (self.count - 1), side='right'))
+        # the middle of the bucket in terms of the relative error
+        value = 2.0 * self.gamma ** (index + self.offset) / (self.gamma + 1.0)
+        return float(min(max(value, self.min), self.max))
+
+    def to_dict(self):
+        self.flush()
+        values, probabilities = self.get_cdf()
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': float(self.min) if self.count else None,
+            'max': float(self.max) if self.count else None,
+            'mean': self.sum / self.count if self.count else None,
+            'quantiles': dict(('%g' % q, self.get_quantile(q)) for q in QUANTILES),
+            'cdf': {'values': values, 'probabilities': probabilities}
+        }
+
+
+class GeneratorStats(object):
+    # distributions over the organisations and flows and the traffic per node of one example
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        self.sketches = {
+            'num_egresses': QuantileSketch(),
+            'organisation_size': QuantileSketch(),
+            'organisation_size2': QuantileSketch(),
+            'organisation_prefixes': QuantileSketch(),
+            'flow_size': QuantileSketch()
+        }
+        self.node_traffic = {
+            'ingress_size': np.zeros(len(self.nodes)),
+            'egress_size': np.zeros(len(self.nodes))
+        }
+
+    def add(self, name, value):
+        self.sketches[name].add(value)
+
+    def update(self, name, values):
+        self.sketches[name].update(values)
+
+    def add_node_traffic(self, name, traffic):
+        # traffic is an array with the traffic of each node
+        self.node_traffic[name] += traffic
+
+    def write(self, output_path):
+        stats = dict((name, sketch.to_dict()) for name, sketch in self.sketches.iteritems())
+        for name, traffic in self.node_traffic.iteritems():
+            # the distribution over the nodes which carry any traffic, as in the original per node statistics
+            sketch = QuantileSketch()
+            sketch.update(traffic[traffic > 0])
+            stats[name] = sketch.to_dict()
+            stats[name]['nodes'] = dict((node, value) for node, value in zip(self.nodes, traffic.tolist()))
+
+        with open(os.path.join(output_path, STATS_FILE), 'w') as outfile:
+            json.dump(stats, outfile)
+
+
+def load_stats(example_path):
+    with open(os.path.join(example_path, STATS_FILE), 'r') as infile:
+        return json.load(infile)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Tests of the failure routing and the what-if scenarios on a synthetic topology with 60 nodes, whose node order changes
+when the graph is copied (run with python -m unittest test_whatif).
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from benchmark import write_graph, write_inputs
+from example_generator import ExampleGenerator
+from routing import Routing
+from whatif import WhatIf, load_scenario
+
+NUM_NODES = 60
+
+
+class WhatIfTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.graph_file = os.path.join(cls.directory, 'synthetic.graphml')
+        cls.graph = write_graph(cls.graph_file, NUM_NODES, np.random.RandomState([0, NUM_NODES]))
+        write_inputs(cls.directory, 400, 30, np.random.RandomState(1))
+
+        cls.example_path = os.path.join(cls.directory, 'synthetic_200')
+        ExampleGenerator(cls.graph_file, os.path.join(cls.directory, 'synthetic'), True, seed=1, formats=('columns', ),
+                         cache_dir=None, plots=False, num_prefixes=(200, ), num_egresses=10,
+                         organisation_file=os.path.join(cls.directory, 'as_to_org.txt'),
+                         rib_file=os.path.join(cls.directory, 'full-ipv4-rib.out'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_copy_changes_node_order(self):
+        # otherwise the other tests do not cover the case they are meant for
+        self.assertNotEqual(nx.nodes(self.graph), nx.nodes(self.graph.copy()))
+
+    def test_failure_routing(self):
+        # the failure routing keeps the node indices and has the same distances as a routing of the failed graph
+        routing = Routing(self.graph)
+        for n1, n2 in self.graph.edges():
+            failure_routing = routing.get_failure_routing([(n1, n2)])
+            self.assertEqual(failure_routing.nodes, routing.nodes)
+
+            graph = self.graph.copy()
+            graph.remove_edge(n1, n2)
+            expected = Routing(graph, nodes=routing.nodes)
+            np.testing.assert_array_equal(failure_routing.distances, expected.distances)
+
+    def test_all_links(self):
+        # each rerouted flow avoids the failed link and goes from its ingress to one of the egresses of its prefix
+        whatif = WhatIf(self.example_path)
+        columns = whatif.columns
+        for n1, n2 in self.graph.edges():
+            whatif.run([(n1, n2)])
+            flows, paths, traffic_sizes = load_scenario(self.example_path, whatif.scenarios[-1]['name'])
+            for flow, path in zip(flows.tolist(), paths):
+                if path is None:
+                    continue
+                self.assertNotIn((n1, n2), zip(path, path[1:]))
+                self.assertNotIn((n2, n1), zip(path, path[1:]))
+                self.assertEqual(path[0], columns.get_path(columns.path[flow])[0])
+                self.assertIn(path[-1], whatif.prefix_egresses[columns.prefix[flow]])
+
+    def test_merged_flows(self):
+        # the flows of a group take distinct paths, the traffic of the merged flows is added to the flow with the same
+        # path and only the traffic of the removed flows is lost
+        whatif = WhatIf(self.example_path)
+        columns = whatif.columns
+        num_merged = 0
+        for n1, n2 in self.graph.edges():
+            scenario = whatif.run([(n1, n2)])
+            num_merged += scenario['merged_flows']
+            flows, paths, traffic_sizes = load_scenario(self.example_path, scenario['name'])
+
+            new_paths = dict(zip(flows.tolist(), paths))
+            group_paths = dict()
+            for flow in np.flatnonzero(np.in1d(whatif.groups, whatif.groups[flows])).tolist():
+                path = new_paths.get(flow, columns.get_path(columns.path[flow]))
+                if path is not None:
+                    group_paths.setdefault(whatif.groups[flow], list()).append(path)
+            for tmp_paths in group_paths.itervalues():
+                self.assertEqual(len(tmp_paths), len(set(tmp_paths)))
+
+            traffic = np.asarray(columns.traffic_size)[flows]
+            self.assertAlmostEqual(traffic.sum() - traffic_sizes.sum(), scenario['removed_traffic'])
+        self.assertGreater(num_merged, 0)
+
+    def test_without_shortest_paths(self):
+        # the shortest path flags are derived from the paths if the columns do not contain them
+        whatif = WhatIf(self.example_path)
+        example_path = os.path.join(self.directory, 'without_shortest')
+        shutil.copytree(self.example_path, example_path)
+        os.remove(os.path.join(example_path, 'ndb_columns', 'path_shortest.npy'))
+        np.testing.assert_array_equal(WhatIf(example_path).shortest, whatif.shortest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Script to derive what-if scenarios (link and node failures) from a generated example. Instead of generating the whole
+example again, the shortest paths are only recomputed for the sources whose shortest path DAG used a failed element and
+only the affected flows are rerouted. A flow is affected if its path used a failed element or if the distance to its
+egress changed, in which case all flows of the same prefix and ingress are rerouted. They keep their prefix, egresses,
+traffic size and additional features, are sent to the closest of the remaining egresses of their prefix and take
+shortest paths (or detours, if they did so before) of the same number as before. As in the example, each flow of a group
+takes a path of its own. If fewer paths are left than the group has flows, the remaining flows are merged into the flow
+which takes the same path and their traffic is added to it. Flows from a failed node or without a reachable egress are
+removed.
+
+The example needs the columns (ndb_columns), the topology (ndb_topo.out) and the egresses of the prefixes
+(ndb_egresses.npz). Each scenario is written as delta against the example to the directory whatif:
+
+    <scenario>.npz      ids of all flows whose path or traffic changed (flows), the id of the new path of each of them
+                        in the path table of the scenario or -1 if the flow is removed or merged (paths), their traffic
+                        size in the scenario (traffic_size, 0 if the flow is removed or merged), the id of the flow
+                        into which each flow is merged or -1 (merged_into) and the path table of the scenario
+                        (path_nodes, path_offsets and path_shortest as in ndb_columns)
+    scenarios.json      failed links and nodes, number of recomputed sources, rerouted, merged and removed flows and
+                        traffic of each scenario
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from routing import Routing
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import ndb_columns
+import ndb_topology
+
+WHATIF_DIR = 'whatif'
+
+
+def get_scenario_name(failed_links, failed_nodes):
+    names = ['link_%s_%s' % (n1, n2) for n1, n2 in failed_links] + ['node_%s' % node for node in failed_nodes]
+    return '+'.join(names)
+
+
+class WhatIf(object):
+    def __init__(self, example_path):
+        self.example_path = example_path
+        self.output_path = os.path.join(example_path, WHATIF_DIR)
+
+        if not os.path.exists(os.path.join(example_path, ndb_columns.EGRESSES_FILE)):
+            raise ValueError('THE EXAMPLE DOES NOT CONTAIN THE EGRESSES OF ITS PREFIXES (%s)' %
+                             ndb_columns.EGRESSES_FILE)
+
+        self.columns = ndb_columns.load_columnar(example_path)
+        self.topo = ndb_topology.load_topology(example_path).to_networkx()
+        self.routing = Routing(self.topo)
+
+        columns = self.columns
+        self.node_ids = dict((node, node_id) for node_id, node in enumerate(columns.nodes))
+        self.num_paths = len(columns.path_offsets) - 1
+
+        # ingress, egress (routing node indices), prefix and shortest path flag of each flow and the group (prefix and
+        # ingress) it belongs to
+        routing_index = np.array([self.routing.node_index[node] for node in columns.nodes], dtype=np.int64)
+        path_ids = np.asarray(columns.path)
+        self.ingress = routing_index[columns.path_ingress][path_ids]
+        self.egress = routing_index[columns.path_egress][path_ids]
+        if columns.path_shortest is not None:
+            path_shortest = np.asarray(columns.path_shortest)
+        else:
+            # the columns do not contain the flag, it is derived from the length of each path as by intern_paths
+            lengths = np.array([ndb_columns.get_path_length(self.topo, columns.get_path(path_id))
+                                for path_id in range(self.num_paths)], dtype=float)
+            path_shortest = lengths <= self.routing.distances[routing_index[columns.path_ingress],
+                                                              routing_index[columns.path_egress]] + 1e-9
+        self.shortest = path_shortest[path_ids]
+        self.groups = np.asarray(columns.prefix).astype(np.int64) * len(columns.nodes) + self.ingress
+        self.path_ids = path_ids
+
+        egresses = ndb_columns.load_egresses(example_path)
+        self.prefix_egresses = [egresses[prefix] for prefix in columns.prefixes]
+
+        # the links (node id pairs, smaller id first) and nodes of each path of the example as flat arrays together with
+        # the path they belong to
+        path_nodes = np.asarray(columns.path_nodes).astype(np.int64)
+        path_lengths = np.diff(columns.path_offsets)
+        self.node_paths = np.repeat(np.arange(self.num_paths), path_lengths)
+        first_nodes = np.ones(len(path_nodes), dtype=bool)
+        first_nodes[columns.path_offsets[:-1]] = False
+        link_ends = np.flatnonzero(first_nodes)
+        self.link_paths = self.node_paths[link_ends]
+        self.link_ids = np.minimum(path_nodes[link_ends - 1], path_nodes[link_ends]) * len(columns.nodes) + \
+            np.maximum(path_nodes[link_ends - 1], path_nodes[link_ends])
+        self.path_nodes = path_nodes
+        self.example_path_ids = dict((columns.get_path(path_id), path_id) for path_id in range(self.num_paths))
+
+        self.scenarios = list()
+
+    def get_broken_paths(self, failed_links, failed_nodes):
+        # whether each path of the example uses a failed link or node
+        num_nodes = len(self.columns.nodes)
+        failed_link_ids = [min(self.node_ids[n1], self.node_ids[n2]) * num_nodes + max(self.node_ids[n1],
+                                                                                       self.node_ids[n2])
+                           for n1, n2 in failed_links]
+        failed_node_ids = [self.node_ids[node] for node in failed_nodes]
+
+        broken = np.zeros(self.num_paths, dtype=bool)
+        broken[self.link_paths[np.in1d(self.link_ids, failed_link_ids)]] = True
+        broken[self.node_paths[np.in1d(self.path_nodes, failed_node_ids)]] = True
+        return broken
+
+    def run(self, failed_links=(), failed_nodes=()):
+        # computes the scenario in which the given links (pairs of nodes) and nodes failed and writes its delta
+        name = get_scenario_name(failed_links, failed_nodes)
+        failed_nodes = set(failed_nodes)
+        # the failure routing uses the same node indices as self.routing, such that self.ingress and self.egress are
+        # valid for both
+        routing = self.routing.get_failure_routing(failed_links, failed_nodes)
+
+        affected = self.get_broken_paths(failed_links, failed_nodes)[self.path_ids]
+        affected |= routing.distances[self.ingress, self.egress] != self.routing.distances[self.ingress, self.egress]
+
+        # all flows of the affected groups, sorted by group such that each group is a consecutive range
+        flows = np.flatnonzero(np.in1d(self.groups, np.unique(self.groups[affected])))
+        flows = flows[np.argsort(self.groups[flows], kind='mergesort')]
+        starts = np.flatnonzero(np.r_[True, np.diff(self.groups[flows]) != 0])
+        ends = np.r_[starts[1:], len(flows)]
+
+        # new path of each flow and the position (in flows) of the flow into which it is merged
+        new_paths = np.full(len(flows), -1, dtype=np.int64)
+        merged_into = np.full(len(flows), -1, dtype=np.int64)
+        for start, end in zip(starts, ends):
+            flow = flows[start]
+            ingress = routing.nodes[self.ingress[flow]]
+            if ingress in failed_nodes:
+                continue
+
+            egresses = [egress for egress in self.prefix_egresses[self.columns.prefix[flow]]
+                        if egress not in failed_nodes]
+            if not egresses:
+                continue
+            egress_index = routing.get_closest_egresses(egresses)[self.ingress[flow]]
+            if routing.distances[self.ingress[flow], egress_index] == np.inf:
+                continue
+            egress = routing.nodes[egress_index]
+
+            tmp_paths = list()
+            if not self.shortest[flow]:
+                tmp_paths = routing.get_non_shortest_paths(ingress, egress)
+            if not tmp_paths:
+                tmp_paths = routing.get_shortest_paths(ingress, egress)
+            if not tmp_paths and ingress == egress:
+                tmp_paths = [routing.get_path_id([egress], True)]
+            if not tmp_paths:
+                # no path to the egress is left, the flows of the group are removed
+                continue
+
+            # one flow per path, the flows beyond the number of paths are merged into the flow with the same path
+            num_paths = min(end - start, len(tmp_paths))
+            new_paths[start:start + num_paths] = tmp_paths[:num_paths]
+            merged_into[start + num_paths:end] = start + np.arange(num_paths, end - start) % num_paths
+
+        merged = merged_into >= 0
+        traffic = np.asarray(self.columns.traffic_size)[flows]
+        new_traffic = np.where(new_paths >= 0, traffic, 0)
+        np.add.at(new_traffic, merged_into[merged], traffic[merged])
+        merged_into[merged] = flows[merged_into[merged]]
+
+        # only keep the flows whose path or traffic changed (removed and merged flows have the path -1 which maps to
+        # -1), the paths are stored with the node ids of the example
+        example_path_ids = np.array([self.example_path_ids.get(path[0], -1) for path in routing.paths] + [-1])
+        rerouted = example_path_ids[new_paths] != self.path_ids[flows]
+        changed = rerouted | (new_traffic != traffic)
+        order = np.argsort(flows[changed])
+        flows = flows[changed][order]
+        new_paths = new_paths[changed][order]
+        rerouted = rerouted[changed][order] & (new_paths >= 0)
+        merged = merged[changed][order]
+        removed = (new_paths < 0) & ~merged
+        traffic = traffic[changed][order]
+        new_traffic = new_traffic[changed][order]
+        merged_into = merged_into[changed][order]
+
+        used_paths, delta_paths = np.unique(new_paths[new_paths >= 0], return_inverse=True)
+        paths = np.full(len(new_paths), -1, dtype=np.int64)
+        paths[new_paths >= 0] = delta_paths
+        path_offsets = np.zeros(len(used_paths) + 1, dtype=np.int64)
+        path_offsets[1:] = np.cumsum([len(routing.paths[path_id][0]) for path_id in used_paths])
+        path_nodes = np.array([self.node_ids[node] for path_id in used_paths for node in routing.paths[path_id][0]],
+                              dtype=np.asarray(self.columns.path_nodes).dtype)
+        path_shortest = np.array([routing.paths[path_id][4] for path_id in used_paths], dtype=bool)
+
+        if not os.path.exists(self.output_path):
+            os.makedirs(self.output_path)
+        np.savez(os.path.join(self.output_path, '%s.npz' % name), flows=flows, paths=paths, traffic_size=new_traffic,
+                 merged_into=merged_into, path_nodes=path_nodes, path_offsets=path_offsets, path_shortest=path_shortest)
+
+        scenario = {
+            'name': name,
+            'failed_links': [list(link) for link in failed_links],
+            'failed_nodes': sorted(failed_nodes),
+            'recomputed_sources': len(routing.affected_sources),
+            'rerouted_flows': int(rerouted.sum()),
+            'merged_flows': int(merged.sum()),
+            'removed_flows': int(removed.sum()),
+            'rerouted_traffic': float(traffic[rerouted].sum()),
+            'merged_traffic': float(traffic[merged].sum()),
+            'removed_traffic': float(traffic[removed].sum())
+        }
+        self.scenarios.append(scenario)
+        return scenario
+
+    def close(self):
+        with open(os.path.join(self.output_path, 'scenarios.json'), 'w') as outfile:
+            json.dump(self.scenarios, outfile)
+
+
+def load_scenario(example_path, name):
+    # returns the ids of the flows whose path or traffic changed in the scenario, the new path of each of them (None if
+    # the flow is removed or merged into another flow) and their traffic size in the scenario
+    data = np.load(os.path.join(example_path, WHATIF_DIR, '%s.npz' % name))
+    with open(os.path.join(example_path, ndb_columns.COLUMNS_DIR, 'meta.json'), 'r') as infile:
+        nodes = json.load(infile)['nodes']
+
+    path_offsets = data['path_offsets']
+    path_nodes = data['path_nodes']
+    paths = [tuple(nodes[node_id] for node_id in path_nodes[path_offsets[i]:path_offsets[i + 1]])
+             for i in range(len(path_offsets) - 1)]
+    return data['flows'], [paths[path_id] if path_id >= 0 else None for path_id in data['paths']], data['traffic_size']
+
+
+def main(example_path, links, nodes, all_links, all_nodes):
+    start = time.time()
+    whatif = WhatIf(example_path)
+    print 'BASELINE LOADED IN %.2fs' % (time.time() - start, )
+
+    scenarios = list()
+    if links or nodes:
+        scenarios.append((links, nodes))
+    if all_links:
+        scenarios.extend(([link], []) for link in sorted(set(tuple(sorted(link)) for link in whatif.topo.edges())))
+    if all_nodes:
+        scenarios.extend(([], [node]) for node in sorted(whatif.topo.nodes()))
+
+    for failed_links, failed_nodes in scenarios:
+        start = time.time()
+        scenario = whatif.run(failed_links, failed_nodes)
+        print '%s: %d sources recomputed, %d flows rerouted, %d flows merged, %d flows removed (%.2fs)' % (
+            scenario['name'], scenario['recomputed_sources'], scenario['rerouted_flows'], scenario['merged_flows'],
+            scenario['removed_flows'], time.time() - start)
+
+    whatif.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parser.add_argument('-l', '--link', help='failed link (all given failures form one scenario)', nargs=2,
+                        action='append', default=list(), metavar=('NODE1', 'NODE2'))
+    parser.add_argument('-n', '--node', help='failed node (all given failures form one scenario)', action='append',
+                        default=list())
+    parser.add_argument('--all-links', help='one scenario for the failure of each link', action='store_true')
+    parser.add_argument('--all-nodes', help='one scenario for the failure of each node', action='store_true')
+    parsed_args = parser.parse_args()
+
+    main(parsed_args.path, [tuple(link) for link in parsed_args.link], parsed_args.node, parsed_args.all_links,
+         parsed_args.all_nodes)
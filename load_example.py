@@ -3,16 +3,41 @@
 
 import argparse
 import networkx as nx
+import numpy as np
 import os
-import pickle
 import random
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
-def load_example(topo_path, data_path):
+from ndb_columns import intern_paths, load_columnar, load_distances
+from ndb_fec import FEC_FILE
+from ndb_metrics import PhaseMetrics, write_metrics
+from ndb_sample import sample_example
+from ndb_shards import SHARDS_DIR, load_shards, select_flows
+from ndb_stream import iter_stream
+
+
+def load_example(topo_path, data_path, table=False, metrics=None, destinations=None, prefixes=None):
+    # returns the flows as list of NDBEntry or, if table is set, as NDBTable. For the forwarding equivalence classes in
+    # ndb_fec.out, the flows are returned as NDBClasses which creates them only when they are accessed. The phases of
+    # loading are recorded in metrics (a PhaseMetrics), if given.
+    # With destinations and/or prefixes, only all flows of the given destinations and the flows of the given prefixes
+    # are returned. If data_path is the directory ndb_shards, only the flows of these destinations are read.
+    if metrics is None:
+        metrics = PhaseMetrics()
 
     # read data from file
-    with open(data_path, 'r') as infile:
-        data = pickle.load(infile)
+    with metrics.phase('load_data'):
+        if os.path.isdir(data_path):
+            data = load_shards(data_path, destinations, prefixes)
+        else:
+            with open(data_path, 'rb') as infile:
+                data = pickle.load(infile)
+            if destinations is not None or prefixes is not None:
+                data = select_flows(data, destinations, prefixes)
 
     destination_to_prefix = data['destination_to_prefix']
     prefix_to_destination = data['prefix_to_destination']
@@ -21,19 +46,104 @@ def load_example(topo_path, data_path):
     name_to_node = data['name_to_node']
 
     # topology
-    topo = nx.read_gpickle(topo_path)
+    with metrics.phase('load_topo'):
+        topo = nx.read_gpickle(topo_path)
 
-    paths = list()
-    for path in data['paths']:
-        shortest_path = len(path[0]) <= len(nx.shortest_path(topo, source=path[0][0], target=path[0][-1]))
-        paths.append(NDBEntry(path[0], path[1], path[2], shortest_path, path[4], path[3]))
+        # the flows refer to their path by its id in the path table, older dumps contain the paths themselves
+        if 'path_table' in data:
+            path_table = data['path_table']
+        else:
+            nodes, distances = load_distances(os.path.dirname(topo_path), topo)
+            path_table = intern_paths(data['paths'], topo, nodes, distances)
+
+    with metrics.phase('build_entries') as record:
+        if 'classes' in data:
+            paths = NDBClasses(data['classes'], data['paths'], path_table, data['traffic_mode'])
+            if table:
+                paths = NDBTable.from_flows(list(paths.iter_flows()), path_table)
+        else:
+            paths = build_entries(data['paths'], path_table, table)
+        record['num_flows'] = len(paths)
 
     return paths, topo, destination_to_prefix, prefix_to_destination, node_to_name, name_to_node
 
 
+def build_entries(flows, path_table, table=False):
+    # flows as stored in ndb_dump.out as list of NDBEntry or, if table is set, as NDBTable
+    if table:
+        return NDBTable.from_flows(flows, path_table)
+    return [NDBEntry(flow[0], flow[1], flow[2], path_table[flow[0]][4], flow[4], flow[3], path_table=path_table)
+            for flow in flows]
+
+
+def load_sample(example_path, sample_size, seed=None, table=False, metrics=None):
+    # traffic-weighted sample of sample_size flows read in a single pass (see ndb_sample), returns the sampled flows as
+    # list of NDBEntry or NDBTable, the weight of each of them and the same topology and mappings as load_example. The
+    # traffic sizes (or counts) of the sampled flows multiplied by their weights give unbiased estimates of the traffic
+    # (or number of flows) in the whole example.
+    if metrics is None:
+        metrics = PhaseMetrics()
+
+    with metrics.phase('sample') as record:
+        data, weights, info = sample_example(example_path, sample_size, seed)
+        record.update(info)
+
+    with metrics.phase('load_topo'):
+        topo = nx.read_gpickle(os.path.join(example_path, 'ndb_topo.out'))
+
+    with metrics.phase('build_entries', len(data['paths'])):
+        paths = build_entries(data['paths'], data['path_table'], table)
+
+    return paths, weights, topo, data['destination_to_prefix'], data['prefix_to_destination'], data['node_to_name'], \
+        data['name_to_node']
+
+
+def iter_example(example_path, chunks=False):
+    # read the flows from ndb_stream.out one chunk at a time and yield them as NDBEntry (or a list of NDBEntry per chunk
+    # if chunks is set), the full dataset is never held in memory
+    for _, path_table, flows in iter_stream(example_path):
+        entries = [NDBEntry(flow[0], flow[1], flow[2], path_table[flow[0]][4], flow[4], flow[3], path_table=path_table)
+                   for flow in flows]
+        if chunks:
+            yield entries
+        else:
+            for entry in entries:
+                yield entry
+
+
+# feature -> function returning the value of that feature of an NDBEntry, the accessors of the additional features are
+# added on first use
+ENTRY_ACCESSORS = {
+    'path': lambda entry: entry.path_table[entry.path_id][0],
+    'prefix': lambda entry: entry.prefix,
+    'destination': lambda entry: entry.destination,
+    'egress': lambda entry: entry.path_table[entry.path_id][2],
+    'ingress': lambda entry: entry.path_table[entry.path_id][1],
+    'shortest_path': lambda entry: entry.shortest_path
+}
+
+
+def get_entry_accessor(key):
+    accessor = ENTRY_ACCESSORS.get(key)
+    if accessor is None and 'feature_' in key:
+        feature_id = int(key.split('_')[1])
+        accessor = ENTRY_ACCESSORS[key] = lambda entry: entry.additional_features[feature_id]
+    return accessor
+
+
 class NDBEntry(object):
-    def __init__(self, path, destination, prefix, shortest_path, additional_features, traffic_size=1):
-        self.path = path
+    __slots__ = ('path_id', 'path_table', 'prefix', 'destination', 'shortest_path', 'additional_features',
+                 'traffic_size')
+
+    def __init__(self, path, destination, prefix, shortest_path, additional_features, traffic_size=1, path_table=None):
+        # the path is either given as list of nodes or as id of a (path, ingress, egress, length, is shortest path)
+        # entry in the path table which is shared by all entries
+        if path_table is None:
+            path_table = [(tuple(path), path[0], path[-1], len(path) - 1, shortest_path)]
+            path = 0
+
+        self.path_id = path
+        self.path_table = path_table
         self.prefix = prefix
         self.destination = destination
         self.shortest_path = shortest_path
@@ -41,24 +151,33 @@ class NDBEntry(object):
 
         self.traffic_size = traffic_size
 
+    @property
+    def path(self):
+        return self.path_table[self.path_id][0]
+
+    @path.setter
+    def path(self, path):
+        # the entry gets a path table of its own with only the new path, the shared path table is left unchanged
+        self.path_table = [(tuple(path), path[0], path[-1], len(path) - 1, self.shortest_path)]
+        self.path_id = 0
+
+    def __getstate__(self):
+        # only the entry of the path of this flow is pickled, not the whole shared path table
+        return (self.path_table[self.path_id], self.prefix, self.destination, self.shortest_path,
+                self.additional_features, self.traffic_size)
+
+    def __setstate__(self, state):
+        path_entry, self.prefix, self.destination, self.shortest_path, self.additional_features, self.traffic_size = \
+            state
+        self.path_table = [path_entry]
+        self.path_id = 0
+
     def get(self, key):
-        if key == 'path':
-            return tuple(self.path)
-        elif key == 'prefix':
-            return self.prefix
-        elif key == 'destination':
-            return self.destination
-        elif key == 'egress':
-            return self.path[-1]
-        elif key == 'ingress':
-            return self.path[0]
-        elif key == 'shortest_path':
-            return self.shortest_path
-        elif 'feature_' in key:
-            feature_id = int(key.split('_')[1])
-            return self.additional_features[feature_id]
-        else:
+        accessor = get_entry_accessor(key)
+        if accessor is None:
             print 'UNKNOWN FEATURE: %s' % key
+            return None
+        return accessor(self)
 
     def __str__(self):
         return "{path} - {destination} - {prefix} - {size}".format(path=" -> ".join(self.path),
@@ -70,19 +189,244 @@ class NDBEntry(object):
         return self.__str__()
 
 
-def main(example_path):
+class NDBTable(object):
+    # the flows of an example stored as columns: the path id, the destination and prefix codes, the traffic size and the
+    # additional features of each flow. Indexing and iterating yield NDBEntry views of single flows.
+    def __init__(self, path_table, path_ids, destinations, destination_codes, prefixes, prefix_codes, traffic_sizes,
+                 additional_features):
+        self.path_table = path_table
+        self.path_ids = path_ids
+        self.destinations = destinations
+        self.destination_codes = destination_codes
+        self.prefixes = prefixes
+        self.prefix_codes = prefix_codes
+        self.traffic_sizes = traffic_sizes
+        self.additional_features = additional_features
+
+        self.num_features = additional_features.shape[1]
+        self.accessors = dict()
+
+    @classmethod
+    def from_flows(cls, flows, path_table):
+        # table of flows as stored in ndb_dump.out, i.e., (path id, destination, prefix, traffic size, features)
+        num_flows = len(flows)
+        num_features = len(flows[0][4]) if flows else 0
+        path_ids, destinations, prefixes, traffic_sizes, additional_features = zip(*flows) if flows else [()] * 5
+
+        destination_ids = dict()
+        prefix_ids = dict()
+        destination_codes = np.fromiter((destination_ids.setdefault(destination, len(destination_ids))
+                                         for destination in destinations), dtype=np.int64, count=num_flows)
+        prefix_codes = np.fromiter((prefix_ids.setdefault(prefix, len(prefix_ids)) for prefix in prefixes),
+                                   dtype=np.int64, count=num_flows)
+        path_ids = np.array(path_ids, dtype=np.int64)
+        traffic_sizes = np.array(traffic_sizes, dtype=np.float64)
+        additional_features = np.array(additional_features, dtype=np.int64).reshape(num_flows, num_features)
+
+        destinations = sorted(destination_ids, key=destination_ids.get)
+        prefixes = sorted(prefix_ids, key=prefix_ids.get)
+        return cls(path_table, path_ids, destinations, destination_codes, prefixes, prefix_codes, traffic_sizes,
+                   additional_features)
+
+    def __len__(self):
+        return len(self.path_ids)
+
+    def __getitem__(self, i):
+        path_id = int(self.path_ids[i])
+        return NDBEntry(path_id, self.destinations[self.destination_codes[i]], self.prefixes[self.prefix_codes[i]],
+                        self.path_table[path_id][4], self.additional_features[i].tolist(), self.traffic_sizes[i],
+                        path_table=self.path_table)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def get_features(self):
+        return ['ingress', 'egress', 'destination', 'shortest_path', 'path'] + \
+               ['feature_%d' % q for q in range(self.num_features)]
+
+    def get_codes(self, key):
+        # the code of the given feature for each flow and the value of each code
+        if key == 'destination':
+            return self.destination_codes, self.destinations
+        elif key == 'prefix':
+            return self.prefix_codes, self.prefixes
+        elif key == 'path':
+            return self.path_ids, [entry[0] for entry in self.path_table]
+        elif key in ('ingress', 'egress', 'shortest_path'):
+            column = {'ingress': 1, 'egress': 2, 'shortest_path': 4}[key]
+            value_ids = dict()
+            path_codes = np.array([value_ids.setdefault(entry[column], len(value_ids)) for entry in self.path_table],
+                                  dtype=np.int64)
+            return path_codes[self.path_ids], sorted(value_ids, key=value_ids.get)
+        elif 'feature_' in key:
+            column = self.additional_features[:, int(key.split('_')[1])]
+            return column, range(int(column.max()) + 1 if len(column) else 0)
+        raise KeyError('UNKNOWN FEATURE: %s' % key)
+
+    def get_accessor(self, key):
+        # function returning the values of the given feature for an index (e.g., a slice or an array of flow ids), the
+        # feature is resolved only once
+        accessor = self.accessors.get(key)
+        if accessor is None:
+            if key == 'traffic_size':
+                accessor = self.traffic_sizes.__getitem__
+            elif 'feature_' in key:
+                accessor = self.additional_features[:, int(key.split('_')[1])].__getitem__
+            else:
+                codes, values = self.get_codes(key)
+                value_array = np.empty(len(values), dtype=object)
+                value_array[:] = values
+                accessor = lambda rows: value_array[codes[rows]]
+            self.accessors[key] = accessor
+        return accessor
+
+    def get_column(self, key):
+        return self.get_accessor(key)(slice(None))
+
+
+class NDBClasses(object):
+    # the flows of an example aggregated into forwarding equivalence classes (see ndb_fec). Each path of a class stands
+    # for one flow per prefix of the class, these flows follow each other and are only created when they are accessed.
+    def __init__(self, classes, class_paths, path_table, traffic_mode):
+        self.classes = classes
+        self.class_paths = class_paths
+        self.path_table = path_table
+        self.traffic_mode = traffic_mode
+
+        # id of the first flow of each path of a class
+        self.offsets = np.zeros(len(class_paths) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(classes[class_path[1]][1]) for class_path in class_paths])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def get_flows(self, row):
+        # the flows along the given path of a class as (path id, destination, prefix, traffic size, features), with the
+        # traffic mode sum the traffic of the class is split evenly among its prefixes
+        path_id, class_id, traffic, features = self.class_paths[row]
+        organisation, prefixes = self.classes[class_id]
+        if self.traffic_mode == 'sum':
+            traffic = [traffic / len(prefixes)] * len(prefixes)
+        return [(path_id, organisation, prefix, flow_size, features) for prefix, flow_size in zip(prefixes, traffic)]
+
+    def iter_flows(self):
+        for row in xrange(len(self.class_paths)):
+            for flow in self.get_flows(row):
+                yield flow
+
+    def get_entry(self, flow):
+        return NDBEntry(flow[0], flow[1], flow[2], self.path_table[flow[0]][4], flow[4], flow[3],
+                        path_table=self.path_table)
+
+    def __iter__(self):
+        for flow in self.iter_flows():
+            yield self.get_entry(flow)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('FLOW %d DOES NOT EXIST' % i)
+        row = int(np.searchsorted(self.offsets, i, side='right')) - 1
+        return self.get_entry(self.get_flows(row)[i - self.offsets[row]])
+
+    def get_class_entries(self):
+        # one NDBEntry per path of a class with the traffic of all its prefixes, the prefix is the tuple of the prefixes
+        # of the class. Summaries over the features other than the prefix can be computed on these entries instead of
+        # the flows.
+        entries = list()
+        for path_id, class_id, traffic, features in self.class_paths:
+            organisation, prefixes = self.classes[class_id]
+            traffic_size = traffic if self.traffic_mode == 'sum' else sum(traffic)
+            entries.append(NDBEntry(path_id, organisation, tuple(prefixes), self.path_table[path_id][4], features,
+                                    traffic_size, path_table=self.path_table))
+        return entries
+
+
+def main(example_path, columnar, stream, fec, metrics, destinations, prefixes, sample_size, seed):
     topo_file = "ndb_topo.out"
-    data_file = "ndb_dump.out"
+    # examples generated with the aggregation fec only have ndb_fec.out
+    if not os.path.exists(os.path.join(example_path, "ndb_dump.out")) and \
+            os.path.exists(os.path.join(example_path, FEC_FILE)):
+        fec = True
+    data_file = FEC_FILE if fec else "ndb_dump.out"
+
+    # a selection of destinations or prefixes is read from the shards if the example has them
+    selection = destinations or prefixes
+    if selection and not fec and os.path.isdir(os.path.join(example_path, SHARDS_DIR)):
+        data_file = SHARDS_DIR
 
     topo_path = os.path.join(example_path, topo_file)
     data_path = os.path.join(example_path, data_file)
 
-    paths, topo, dest_to_prefix, prefix_to_dest, node_to_name, name_to_node = load_example(topo_path, data_path)
+    # the phases of loading are written to the section load of metrics.json in the example directory
+    load_metrics = PhaseMetrics('load')
+    metrics_info = {'format': 'columns' if columnar else 'stream' if stream else 'sample' if sample_size
+                    else data_file}
+
+    if columnar:
+        with load_metrics.phase('load_columns') as record:
+            columns = load_columnar(example_path)
+            record['num_flows'] = len(columns)
+        if metrics:
+            write_metrics(example_path, 'load', load_metrics.phases, info=metrics_info)
+        flow_id = random.randrange(len(columns))
+
+        output = "Successfully read the example columns.\n"
+        output += "There is a total of {} flows over {} paths for {} destinations.\n\n".format(
+            len(columns), len(columns.path_offsets) - 1, len(columns.destinations))
+        output += "This is a random flow: {path} - {destination} - {prefix} - {size}".format(
+            path=" -> ".join(columns.get_path(columns.path[flow_id])),
+            destination=columns.destinations[columns.destination[flow_id]],
+            prefix=columns.prefixes[columns.prefix[flow_id]],
+            size=columns.traffic_size[flow_id])
+
+        print output
+        return
+
+    if stream:
+        num_flows = 0
+        traffic = 0
+        with load_metrics.phase('stream') as record:
+            for entries in iter_example(example_path, chunks=True):
+                num_flows += len(entries)
+                traffic += sum(entry.traffic_size for entry in entries)
+            record['num_flows'] = num_flows
+        if metrics:
+            write_metrics(example_path, 'load', load_metrics.phases, info=metrics_info)
+
+        output = "Successfully streamed the example.\n"
+        output += "There is a total of {} flows with a total traffic of {}.".format(num_flows, traffic)
+
+        print output
+        return
+
+    if sample_size:
+        paths, weights = load_sample(example_path, sample_size, seed, metrics=load_metrics)[:2]
+        if metrics:
+            write_metrics(example_path, 'load', load_metrics.phases, info=metrics_info)
+
+        output = "Successfully sampled the example.\n"
+        output += "The {} sampled flows stand for {:.0f} flows with a total traffic of {:.1f}.\n\n".format(
+            len(paths), weights.sum(), sum(entry.traffic_size * weight for entry, weight in zip(paths, weights)))
+        output += "This is a random flow: {}".format(random.choice(paths))
+
+        print output
+        return
+
+    paths, topo, dest_to_prefix, prefix_to_dest, node_to_name, name_to_node = load_example(
+        topo_path, data_path, metrics=load_metrics, destinations=destinations if selection else None,
+        prefixes=prefixes if selection else None)
+    if metrics:
+        write_metrics(example_path, 'load', load_metrics.phases, info=metrics_info)
 
     output = "Successfully read the example files.\n"
     output += "There is a total of {} flows in a topology with {} nodes and {} edges.\n\n".format(len(paths),
                                                                                                   len(topo.nodes()),
                                                                                                   len(topo.edges()))
+    if selection:
+        output += "They belong to {} destinations with {} prefixes.\n\n".format(len(dest_to_prefix), len(prefix_to_dest))
     output += "This is a random flow: {}".format(random.choice(paths))
 
     print output
@@ -91,6 +435,20 @@ def main(example_path):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parser.add_argument('-c', '--columnar', help='read the columns instead of the dump', action='store_true')
+    parser.add_argument('-s', '--stream', help='stream the flows chunk by chunk from ndb_stream.out',
+                        action='store_true')
+    parser.add_argument('-e', '--fec', help='read the forwarding equivalence classes from ndb_fec.out',
+                        action='store_true')
+    parser.add_argument('-m', '--metrics', help='write the time and memory of each phase of loading to metrics.json',
+                        action='store_true')
+    parser.add_argument('-d', '--destination', help='only read all flows of this destination (from ndb_shards if the '
+                                                    'example has it)', action='append', default=list())
+    parser.add_argument('-p', '--prefix', help='only read the flows of this prefix (from ndb_shards if the example has '
+                                               'it)', action='append', default=list())
+    parser.add_argument('-n', '--sample-size', help='only read a traffic-weighted sample of this many flows', type=int)
+    parser.add_argument('--seed', help='seed for the sampling of the flows', type=int)
     parsed_args = parser.parse_args()
 
-    main(parsed_args.path)
+    main(parsed_args.path, parsed_args.columnar, parsed_args.stream, parsed_args.fec, parsed_args.metrics,
+         parsed_args.destination, parsed_args.prefix, parsed_args.sample_size, parsed_args.seed)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Columnar storage of a generated example. Next to ndb_dump.out, the flows are stored as typed numpy columns in the
+directory ndb_columns, each of which can be memory mapped:
+
+    meta.json               number of flows and features, the nodes, destinations and prefixes (dictionaries)
+    destination.npy         destination id of each flow (index into the destinations in meta.json)
+    prefix.npy              prefix id of each flow (index into the prefixes in meta.json)
+    path.npy                path id of each flow
+    traffic_size.npy        size of each flow (float64)
+    features.npy            additional features of each flow (one row per flow)
+    path_nodes.npy          node ids (index into the nodes in meta.json) of all paths, one after the other
+    path_offsets.npy        start of each path in path_nodes (one more entry than there are paths)
+    path_shortest.npy       whether each path is a shortest path (only if known)
+    prefix_destination.npy  destination id of each prefix
+
+Next to ndb_topo.out, the length of the shortest path between any two nodes is stored in ndb_distances.npz (nodes and
+distances), such that checking whether a path is a shortest path does not require a graph search. The egresses of each
+prefix are stored in ndb_egresses.npz (nodes, prefixes, and the node ids of the egresses of all prefixes one after the
+other with the start of each prefix in egress_offsets).
+
+Use this script to convert the ndb_dump.out of an existing example.
+"""
+
+import argparse
+import json
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import networkx as nx
+import numpy as np
+
+COLUMNS_DIR = 'ndb_columns'
+COLUMNS_VERSION = 1
+
+DISTANCES_FILE = 'ndb_distances.npz'
+EGRESSES_FILE = 'ndb_egresses.npz'
+
+CHUNK_SIZE = 100000
+
+
+def get_id_dtype(num_ids):
+    # smallest unsigned integer type which can hold all ids
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if num_ids <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+class ColumnarWriter(object):
+    # writes the flows of an example in chunks to the columns. The values of each column are appended to a raw file
+    # and only turned into a .npy file once the total number of flows is known.
+    def __init__(self, output_path, nodes, destination_to_prefix, node_to_name, num_features, max_feature_value):
+        self.directory = os.path.join(output_path, COLUMNS_DIR)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.nodes = list(nodes)
+        self.node_index = dict((node, index) for index, node in enumerate(self.nodes))
+        self.node_to_name = node_to_name
+
+        self.destinations = sorted(destination_to_prefix)
+        self.destination_index = dict((destination, index) for index, destination in enumerate(self.destinations))
+
+        self.prefixes = list()
+        prefix_destinations = list()
+        for destination in self.destinations:
+            self.prefixes.extend(destination_to_prefix[destination])
+            prefix_destinations.extend([self.destination_index[destination]] * len(destination_to_prefix[destination]))
+        self.prefix_index = dict((prefix, index) for index, prefix in enumerate(self.prefixes))
+        self.prefix_destinations = np.array(prefix_destinations, dtype=get_id_dtype(len(self.destinations)))
+
+        # path table, each distinct path is only stored once
+        self.path_ids = dict()
+        self.paths = list()
+        self.path_shortest = list()
+
+        self.num_flows = 0
+        self.num_features = num_features
+        self.dtypes = {
+            'destination': get_id_dtype(len(self.destinations)),
+            'prefix': get_id_dtype(len(self.prefixes)),
+            'path': np.dtype(np.uint32),
+            'traffic_size': np.dtype(np.float64),
+            'features': get_id_dtype(max_feature_value + 1),
+        }
+        self.raw_files = dict((column, open(self.get_raw_file(column), 'wb')) for column in self.dtypes)
+
+    def get_raw_file(self, column):
+        return os.path.join(self.directory, '%s.raw' % (column, ))
+
+    def get_path_id(self, path, shortest_path=None):
+        path = tuple(path)
+        if path not in self.path_ids:
+            self.path_ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.path_shortest.append(shortest_path)
+        return self.path_ids[path]
+
+    def add_path_table(self, path_table):
+        # use the path table of a dump, the ids of the paths stay the same
+        for path, _, _, _, shortest_path in path_table:
+            self.get_path_id(path, shortest_path)
+
+    def append(self, destination_ids, prefix_ids, path_ids, traffic_sizes, features):
+        # append a chunk of flows, all arguments are arrays with one entry (row for the features) per flow
+        columns = {
+            'destination': destination_ids,
+            'prefix': prefix_ids,
+            'path': path_ids,
+            'traffic_size': traffic_sizes,
+            'features': features,
+        }
+        for column, values in columns.iteritems():
+            np.asarray(values, dtype=self.dtypes[column]).tofile(self.raw_files[column])
+        self.num_flows += len(path_ids)
+
+    def write(self, flows, path_table):
+        # append a chunk of flows which refer to their paths by id in the given path table, the path table may have grown
+        # since the previous chunk
+        self.add_path_table(path_table[len(self.paths):])
+        self.append_flows(flows, path_ids=True)
+
+    def append_flows(self, flows, path_ids=False):
+        # append a chunk of flows given as (path, destination, prefix, traffic size, additional features) tuples. If
+        # path_ids is set, the path of each flow is given as the id of the path in the path table.
+        self.append([self.destination_index[flow[1]] for flow in flows],
+                     [self.prefix_index[flow[2]] for flow in flows],
+                     [flow[0] for flow in flows] if path_ids else [self.get_path_id(flow[0]) for flow in flows],
+                     [flow[3] for flow in flows],
+                     np.array([flow[4] for flow in flows]).reshape(len(flows), self.num_features))
+
+    def close(self):
+        for column, raw_file in self.raw_files.iteritems():
+            raw_file.close()
+
+            shape = (self.num_flows, self.num_features) if column == 'features' else (self.num_flows, )
+            column_file = os.path.join(self.directory, '%s.npy' % (column, ))
+            values = np.lib.format.open_memmap(column_file, mode='w+', dtype=self.dtypes[column], shape=shape)
+            raw_values = np.memmap(self.get_raw_file(column), dtype=self.dtypes[column], mode='r', shape=shape)
+            for start in xrange(0, self.num_flows, CHUNK_SIZE):
+                values[start:start + CHUNK_SIZE] = raw_values[start:start + CHUNK_SIZE]
+            values.flush()
+            del values, raw_values
+
+            os.remove(self.get_raw_file(column))
+
+        path_offsets = np.zeros(len(self.paths) + 1, dtype=np.int64)
+        path_offsets[1:] = np.cumsum([len(path) for path in self.paths])
+        path_nodes = np.array([self.node_index[node] for path in self.paths for node in path],
+                              dtype=get_id_dtype(len(self.nodes)))
+        np.save(os.path.join(self.directory, 'path_offsets.npy'), path_offsets)
+        np.save(os.path.join(self.directory, 'path_nodes.npy'), path_nodes)
+        np.save(os.path.join(self.directory, 'prefix_destination.npy'), self.prefix_destinations)
+        if None not in self.path_shortest:
+            np.save(os.path.join(self.directory, 'path_shortest.npy'), np.array(self.path_shortest, dtype=bool))
+
+        meta = {
+            'version': COLUMNS_VERSION,
+            'num_flows': self.num_flows,
+            'num_features': self.num_features,
+            'nodes': self.nodes,
+            'destinations': self.destinations,
+            'prefixes': self.prefixes,
+            'node_to_name': self.node_to_name,
+        }
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as outfile:
+            json.dump(meta, outfile)
+
+
+def save_distances(output_path, nodes, distances):
+    np.savez(os.path.join(output_path, DISTANCES_FILE), nodes=np.array(nodes), distances=distances)
+
+
+def load_distances(example_path, topo):
+    # returns the nodes and the matrix with the length of the shortest path between them. Older examples do not
+    # contain the matrix, then it is computed once from the topology.
+    distances_file = os.path.join(example_path, DISTANCES_FILE)
+    if os.path.exists(distances_file):
+        data = np.load(distances_file)
+        return data['nodes'].tolist(), data['distances']
+
+    nodes = topo.nodes()
+    node_index = dict((node, index) for index, node in enumerate(nodes))
+    distances = np.full((len(nodes), len(nodes)), np.inf)
+    for source, lengths in nx.all_pairs_dijkstra_path_length(topo).iteritems():
+        for target, length in lengths.iteritems():
+            distances[node_index[source], node_index[target]] = length
+    return nodes, distances
+
+
+def save_egresses(output_path, nodes, prefix_egresses):
+    # prefix_egresses is a list of (prefix, node ids of its egresses)
+    egress_offsets = np.zeros(len(prefix_egresses) + 1, dtype=np.int64)
+    egress_offsets[1:] = np.cumsum([len(egresses) for _, egresses in prefix_egresses])
+    egress_nodes = np.array([egress for _, egresses in prefix_egresses for egress in egresses],
+                            dtype=get_id_dtype(len(nodes)))
+    np.savez(os.path.join(output_path, EGRESSES_FILE), nodes=np.array(nodes),
+             prefixes=np.array([prefix for prefix, _ in prefix_egresses]), egress_offsets=egress_offsets,
+             egress_nodes=egress_nodes)
+
+
+def load_egresses(example_path):
+    # returns prefix -> egress nodes in the order in which ties between them are broken
+    data = np.load(os.path.join(example_path, EGRESSES_FILE))
+    nodes = data['nodes'].tolist()
+    egress_offsets = data['egress_offsets']
+    egress_nodes = data['egress_nodes']
+    return dict((prefix, [nodes[egress] for egress in egress_nodes[egress_offsets[i]:egress_offsets[i + 1]]])
+                for i, prefix in enumerate(data['prefixes'].tolist()))
+
+
+def get_path_length(topo, path):
+    length = 0
+    for n1, n2 in zip(path, path[1:]):
+        if topo.is_multigraph():
+            length += min(data.get('weight', 1) for data in topo[n1][n2].itervalues())
+        else:
+            length += topo[n1][n2].get('weight', 1)
+    return length
+
+
+def intern_paths(paths, topo, nodes, distances):
+    # build the path table for a dump without one and replace the path of each flow by its id. Whether a path is a
+    # shortest path is checked for all distinct paths at once against the distance matrix.
+    path_ids = dict()
+    for i, path in enumerate(paths):
+        path_ids.setdefault(tuple(path[0]), len(path_ids))
+        paths[i] = (path_ids[tuple(path[0])], ) + tuple(path[1:])
+
+    path_table = [None] * len(path_ids)
+    for path, path_id in path_ids.iteritems():
+        path_table[path_id] = path
+
+    node_index = dict((node, index) for index, node in enumerate(nodes))
+    ingresses = np.array([node_index[path[0]] for path in path_table], dtype=int)
+    egresses = np.array([node_index[path[-1]] for path in path_table], dtype=int)
+    lengths = np.array([get_path_length(topo, path) for path in path_table], dtype=float)
+    shortest_paths = lengths <= distances[ingresses, egresses] + 1e-9
+
+    return [(path, path[0], path[-1], len(path) - 1, bool(shortest_path))
+            for path, shortest_path in zip(path_table, shortest_paths)]
+
+
+def write_columnar(output_path, data):
+    # write the columns for the data of a dump as it is stored in ndb_dump.out
+    paths = data['paths']
+    num_features = len(paths[0][4]) if paths else 0
+    max_feature_value = max([max(path[4]) for path in paths if path[4]] or [0])
+
+    writer = ColumnarWriter(output_path, sorted(data['node_to_name']), data['destination_to_prefix'],
+                            data['node_to_name'], num_features, max_feature_value)
+    if 'path_table' in data:
+        writer.add_path_table(data['path_table'])
+    for start in xrange(0, len(paths), CHUNK_SIZE):
+        writer.append_flows(paths[start:start + CHUNK_SIZE], path_ids='path_table' in data)
+    writer.close()
+
+
+class NDBColumns(object):
+    # read-only view of the columns of an example, no per-flow objects are created
+    def __init__(self, example_path, mmap=True):
+        directory = os.path.join(example_path, COLUMNS_DIR)
+        with open(os.path.join(directory, 'meta.json'), 'r') as infile:
+            meta = json.load(infile)
+
+        self.num_flows = meta['num_flows']
+        self.num_features = meta['num_features']
+        self.nodes = meta['nodes']
+        self.destinations = meta['destinations']
+        self.prefixes = meta['prefixes']
+        self.node_to_name = meta['node_to_name']
+
+        mmap_mode = 'r' if mmap else None
+        for column in ('destination', 'prefix', 'path', 'traffic_size', 'features', 'path_nodes', 'path_offsets',
+                       'prefix_destination'):
+            setattr(self, column, np.load(os.path.join(directory, '%s.npy' % (column, )), mmap_mode=mmap_mode))
+
+        path_shortest_file = os.path.join(directory, 'path_shortest.npy')
+        self.path_shortest = np.load(path_shortest_file) if os.path.exists(path_shortest_file) else None
+
+        # ingress and egress of each path
+        self.path_ingress = np.asarray(self.path_nodes)[self.path_offsets[:-1]]
+        self.path_egress = np.asarray(self.path_nodes)[self.path_offsets[1:] - 1]
+
+    def __len__(self):
+        return self.num_flows
+
+    def get_path(self, path_id):
+        start, end = self.path_offsets[path_id], self.path_offsets[path_id + 1]
+        return tuple(self.nodes[node_id] for node_id in self.path_nodes[start:end])
+
+    def get_column(self, key):
+        # per flow array of a feature, nodes, destinations and prefixes are given as ids
+        if key == 'ingress':
+            return self.path_ingress[self.path]
+        elif key == 'egress':
+            return self.path_egress[self.path]
+        elif key in ('destination', 'prefix', 'path', 'traffic_size'):
+            return getattr(self, key)
+        elif key == 'shortest_path':
+            if self.path_shortest is None:
+                raise KeyError('THE COLUMNS DO NOT CONTAIN THE SHORTEST PATH FLAGS')
+            return self.path_shortest[self.path]
+        elif key.startswith('feature_'):
+            return self.features[:, int(key.split('_')[1])]
+        else:
+            raise KeyError('UNKNOWN FEATURE: %s' % key)
+
+    def get_destination_to_prefix(self):
+        destination_to_prefix = dict((destination, list()) for destination in self.destinations)
+        for prefix, destination_id in zip(self.prefixes, self.prefix_destination):
+            destination_to_prefix[self.destinations[destination_id]].append(prefix)
+        return destination_to_prefix
+
+    def get_prefix_to_destination(self):
+        return dict((prefix, self.destinations[destination_id])
+                    for prefix, destination_id in zip(self.prefixes, self.prefix_destination))
+
+
+def load_columnar(example_path, mmap=True):
+    return NDBColumns(example_path, mmap=mmap)
+
+
+def convert_dump(example_path, data_file='ndb_dump.out', topo_file='ndb_topo.out'):
+    # create the columns for an existing example from its pickled dump
+    with open(os.path.join(example_path, data_file), 'rb') as infile:
+        data = pickle.load(infile)
+
+    if 'path_table' not in data:
+        topo = nx.read_gpickle(os.path.join(example_path, topo_file))
+        nodes, distances = load_distances(example_path, topo)
+        data['path_table'] = intern_paths(data['paths'], topo, nodes, distances)
+
+    write_columnar(example_path, data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parsed_args = parser.parse_args()
+
+    convert_dump(parsed_args.path)
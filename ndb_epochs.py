@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Traffic time series of a generated example (directory ndb_epochs). The flows (paths, destinations, prefixes and
+additional features) are the same in all epochs and stored once in ndb_dump.out or ndb_columns, only the traffic size
+of each flow changes from epoch to epoch:
+
+    meta.json           number of epochs and flows, the correlation and scale of the traffic sizes
+    epoch_<i>.npy       traffic size of each flow in epoch i (float32, in the order of the flows)
+
+Epoch 0 contains the traffic sizes of the flows. In each further epoch, the traffic size of each flow follows the same
+exponential distribution as the flow sizes of the generator, but is correlated with the previous epoch: the sizes are
+mapped to a standard normal variable which follows an AR(1) process with the given correlation and mapped back. With
+correlation 0, the traffic sizes of all epochs are independent.
+"""
+
+import json
+import os
+
+import numpy as np
+import scipy.special
+
+EPOCHS_DIR = 'ndb_epochs'
+EPOCHS_VERSION = 1
+
+CHUNK_SIZE = 100000
+
+
+class EpochWriter(object):
+    # draws the traffic sizes of all epochs chunk by chunk while the flows are written, each epoch is appended to a raw
+    # file which is only turned into a .npy file once the total number of flows is known
+    def __init__(self, output_path, num_epochs, correlation, scale, random_state):
+        if not -1.0 <= correlation <= 1.0:
+            raise ValueError('THE CORRELATION HAS TO BE BETWEEN -1 AND 1: %f' % correlation)
+
+        self.directory = os.path.join(output_path, EPOCHS_DIR)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.num_epochs = num_epochs
+        self.correlation = correlation
+        self.scale = scale
+        self.random_state = random_state
+
+        self.num_flows = 0
+        self.raw_files = [open(self.get_raw_file(epoch), 'wb') for epoch in range(num_epochs)]
+
+    def get_raw_file(self, epoch):
+        return os.path.join(self.directory, 'epoch_%d.raw' % (epoch, ))
+
+    def write(self, flows, path_table):
+        self.append(np.array([flow[3] for flow in flows], dtype=np.float64))
+
+    def append(self, traffic_sizes):
+        # the normal variable of each flow which corresponds to its traffic size, i.e., Phi(-z) = exp(-size / scale)
+        survival = np.clip(np.exp(-traffic_sizes / self.scale), 1e-300, 1.0 - 1e-16)
+        z = -scipy.special.ndtri(survival)
+
+        noise = self.random_state.standard_normal((self.num_epochs - 1, len(traffic_sizes)))
+        innovation = np.sqrt(1.0 - self.correlation ** 2)
+
+        traffic_sizes.astype(np.float32).tofile(self.raw_files[0])
+        for epoch in range(1, self.num_epochs):
+            z = self.correlation * z + innovation * noise[epoch - 1]
+            (-self.scale * scipy.special.log_ndtr(-z)).astype(np.float32).tofile(self.raw_files[epoch])
+
+        self.num_flows += len(traffic_sizes)
+
+    def close(self):
+        for epoch, raw_file in enumerate(self.raw_files):
+            raw_file.close()
+
+            epoch_file = os.path.join(self.directory, 'epoch_%d.npy' % (epoch, ))
+            values = np.lib.format.open_memmap(epoch_file, mode='w+', dtype=np.float32, shape=(self.num_flows, ))
+            raw_values = np.memmap(self.get_raw_file(epoch), dtype=np.float32, mode='r', shape=(self.num_flows, ))
+            for start in xrange(0, self.num_flows, CHUNK_SIZE):
+                values[start:start + CHUNK_SIZE] = raw_values[start:start + CHUNK_SIZE]
+            values.flush()
+            del values, raw_values
+
+            os.remove(self.get_raw_file(epoch))
+
+        meta = {
+            'version': EPOCHS_VERSION,
+            'num_epochs': self.num_epochs,
+            'num_flows': self.num_flows,
+            'correlation': self.correlation,
+            'scale': self.scale
+        }
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as outfile:
+            json.dump(meta, outfile)
+
+
+class NDBEpochs(object):
+    def __init__(self, example_path, mmap=True):
+        self.directory = os.path.join(example_path, EPOCHS_DIR)
+        with open(os.path.join(self.directory, 'meta.json'), 'r') as infile:
+            meta = json.load(infile)
+
+        self.num_epochs = meta['num_epochs']
+        self.num_flows = meta['num_flows']
+        self.correlation = meta['correlation']
+        self.mmap_mode = 'r' if mmap else None
+
+    def __len__(self):
+        return self.num_epochs
+
+    def get_traffic(self, epoch):
+        # traffic size of each flow in the given epoch
+        return np.load(os.path.join(self.directory, 'epoch_%d.npy' % (epoch, )), mmap_mode=self.mmap_mode)
+
+    def __iter__(self):
+        for epoch in range(self.num_epochs):
+            yield self.get_traffic(epoch)
+
+
+def load_epochs(example_path, mmap=True):
+    return NDBEpochs(example_path, mmap=mmap)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Forwarding equivalence classes of a generated example (ndb_fec.out), written by the generator with the aggregation fec.
+All prefixes of an organisation with the same egresses form a class and use the same paths. Next to the same mappings
+and path table as in ndb_dump.out, the file contains the classes as (organisation, prefixes) and the paths of all
+classes as (path id, class id, traffic, additional features). Depending on the traffic mode, the traffic is either the
+list of the traffic of each prefix of the class (prefix) or their sum (sum).
+
+Each path of a class stands for one flow per prefix of the class, use load_example to expand the classes into flows.
+"""
+
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+FEC_FILE = 'ndb_fec.out'
+FEC_VERSION = 1
+TRAFFIC_MODES = ['prefix', 'sum']
+
+
+def write_fec(output_path, header, path_table, classes, class_paths, traffic_mode):
+    if traffic_mode not in TRAFFIC_MODES:
+        raise ValueError('UNKNOWN TRAFFIC MODE: %s' % traffic_mode)
+
+    data = dict(header)
+    data['version'] = FEC_VERSION
+    data['traffic_mode'] = traffic_mode
+    data['path_table'] = path_table
+    data['classes'] = classes
+    data['paths'] = class_paths
+
+    with open(os.path.join(output_path, FEC_FILE), 'wb') as outfile:
+        pickle.dump(data, outfile, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Index over the flows of a loaded example to compute the traffic and number of flows matching a spec, i.e., a
+conjunction of feature values such as [('egress', 2), ('destination', 'Hydro One Telecom Inc.')].
+
+For each feature, the value of each flow is stored as a code together with the ids of all flows having that value
+(sorted). A spec is answered by taking the flows of its most selective feature value and filtering them by the codes of
+the remaining ones, hence it only touches as many flows as match that single feature value. Destination names are
+compared without any non-alphanumeric characters.
+"""
+
+import re
+
+import numpy as np
+
+
+def normalize(feature, value):
+    if feature == 'destination':
+        return re.sub('[^a-zA-Z0-9]', '', value if isinstance(value, basestring) else str(value))
+    elif feature == 'path':
+        return u' -> '.join(unicode(node) for node in value)
+    return unicode(value)
+
+
+class NDBIndex(object):
+    def __init__(self, traffic_sizes):
+        self.traffic_sizes = np.asarray(traffic_sizes, dtype=np.float64)
+        self.num_flows = len(self.traffic_sizes)
+
+        # feature -> code of each flow, feature -> normalized value -> code, feature -> value of each code and
+        # feature -> (flow ids sorted by code, start of each code in the flow ids)
+        self.codes = dict()
+        self.value_codes = dict()
+        self.values = dict()
+        self.rows = dict()
+
+    def add_feature(self, feature, codes, values):
+        # add a feature given as the code of each flow and the value of each code
+        value_codes = dict()
+        code_values = list()
+        code_map = np.zeros(len(values), dtype=np.int64)
+        for code, value in enumerate(values):
+            normalized_value = normalize(feature, value)
+            if normalized_value not in value_codes:
+                value_codes[normalized_value] = len(value_codes)
+                code_values.append(value)
+            code_map[code] = value_codes[normalized_value]
+
+        codes = code_map[np.asarray(codes, dtype=np.int64)]
+        row_dtype = np.int32 if self.num_flows < 2**31 else np.int64
+
+        self.codes[feature] = codes.astype(row_dtype)
+        self.value_codes[feature] = value_codes
+        self.values[feature] = code_values
+        starts = np.zeros(len(value_codes) + 1, dtype=np.int64)
+        starts[1:] = np.cumsum(np.bincount(codes, minlength=len(value_codes)))
+        self.rows[feature] = (np.argsort(codes, kind='mergesort').astype(row_dtype), starts)
+
+    def add_values(self, feature, flow_values):
+        # add a feature given as the value of each flow
+        value_ids = dict()
+        codes = np.fromiter((value_ids.setdefault(value, len(value_ids)) for value in flow_values), dtype=np.int64,
+                            count=self.num_flows)
+        values = [None] * len(value_ids)
+        for value, code in value_ids.iteritems():
+            values[code] = value
+        self.add_feature(feature, codes, values)
+
+    @classmethod
+    def from_columns(cls, columns):
+        # index over the columns of an example (see ndb_columns)
+        index = cls(columns.traffic_size)
+        index.add_feature('ingress', columns.get_column('ingress'), columns.nodes)
+        index.add_feature('egress', columns.get_column('egress'), columns.nodes)
+        index.add_feature('destination', columns.destination, columns.destinations)
+        index.add_feature('path', columns.path, [columns.get_path(path_id) for path_id in
+                                                 range(len(columns.path_offsets) - 1)])
+        if columns.path_shortest is not None:
+            index.add_feature('shortest_path', columns.get_column('shortest_path'), [False, True])
+        for q in range(columns.num_features):
+            feature_values = np.asarray(columns.get_column('feature_%d' % q))
+            index.add_feature('feature_%d' % q, feature_values, range(int(feature_values.max()) + 1
+                                                                       if len(feature_values) else 0))
+        return index
+
+    @classmethod
+    def from_entries(cls, entries):
+        # index over a list of NDBEntry as returned by load_example (for an NDBTable use from_table)
+        index = cls([entry.traffic_size for entry in entries])
+        features = ['ingress', 'egress', 'destination', 'shortest_path', 'path']
+        if entries:
+            features += ['feature_%d' % q for q in range(len(entries[0].additional_features))]
+        for feature in features:
+            index.add_values(feature, (entry.get(feature) for entry in entries))
+        return index
+
+    @classmethod
+    def from_table(cls, table):
+        # index over an NDBTable as returned by load_example
+        index = cls(table.traffic_sizes)
+        for feature in table.get_features():
+            codes, values = table.get_codes(feature)
+            index.add_feature(feature, codes, values)
+        return index
+
+    def get_rows(self, feature, value):
+        # sorted ids of all flows with the given value of a feature
+        code = self.value_codes[feature].get(normalize(feature, value))
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        order, starts = self.rows[feature]
+        return order[starts[code]:starts[code + 1]]
+
+    def select(self, feature_values):
+        # sorted ids of all flows which match all the given (feature, value) pairs
+        if not feature_values:
+            return np.arange(self.num_flows)
+
+        candidates = sorted((len(self.get_rows(feature, value)), i) for i, (feature, value) in enumerate(feature_values))
+        feature, value = feature_values[candidates[0][1]]
+        rows = self.get_rows(feature, value)
+
+        for _, i in candidates[1:]:
+            if not len(rows):
+                break
+            feature, value = feature_values[i]
+            code = self.value_codes[feature][normalize(feature, value)]
+            rows = rows[self.codes[feature][rows] == code]
+
+        return rows
+
+    def query(self, feature_values):
+        # traffic and number of flows which match all the given (feature, value) pairs
+        rows = self.select(feature_values)
+        return self.traffic_sizes[rows].sum(), len(rows)
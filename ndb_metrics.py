@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Instrumentation of the phases of generating and loading an example. For each phase, the wall time, the CPU time of the
+process, the peak resident memory of the process at the end of the phase and, if known, the number of flows and the
+throughput are recorded. Optionally, each phase is profiled with cProfile and the statistics are dumped to
+<profile_dir>/<label>_<phase>.prof.
+
+The metrics are written to metrics.json next to config.json, with one section per activity (generate, load):
+
+    {"generate": {"info": {...}, "phases": [{"name": "get_graph", "wall_time": 0.1, ...}, ...]}, "load": {...}}
+
+CPU time of worker processes is not included.
+"""
+
+import cProfile
+from contextlib import contextmanager
+import json
+import os
+import resource
+import sys
+import time
+
+METRICS_FILE = 'metrics.json'
+
+
+def get_peak_rss():
+    # peak resident memory of this process in MB (ru_maxrss is given in bytes on OS X and in KB elsewhere)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak_rss / 1024.0
+
+
+def get_cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class PhaseMetrics(object):
+    def __init__(self, label='', profile_dir=None):
+        self.label = label
+        self.profile_dir = profile_dir
+        self.phases = list()
+
+    @contextmanager
+    def phase(self, name, num_flows=None):
+        # records the block as phase, the number of flows can also be set within the block on the yielded record
+        record = {'name': name, 'num_flows': num_flows}
+
+        profile = None
+        if self.profile_dir:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        start_wall_time = time.time()
+        start_cpu_time = get_cpu_time()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.time() - start_wall_time
+            record['cpu_time'] = get_cpu_time() - start_cpu_time
+            record['peak_rss_mb'] = get_peak_rss()
+            if record['num_flows'] is not None and record['wall_time'] > 0:
+                record['flows_per_second'] = record['num_flows'] / record['wall_time']
+
+            if profile:
+                profile.disable()
+                if not os.path.exists(self.profile_dir):
+                    os.makedirs(self.profile_dir)
+                file_name = '%s_%s.prof' % (self.label, name) if self.label else '%s.prof' % (name, )
+                profile.dump_stats(os.path.join(self.profile_dir, file_name))
+
+            self.phases.append(record)
+
+
+def get_total(phases):
+    return {
+        'wall_time': sum(phase['wall_time'] for phase in phases),
+        'cpu_time': sum(phase['cpu_time'] for phase in phases),
+        'peak_rss_mb': max([phase['peak_rss_mb'] for phase in phases] or [get_peak_rss()])
+    }
+
+
+def write_metrics(output_path, section, phases, info=None):
+    # write the phases (list of records) to the given section of metrics.json, the other sections are kept
+    metrics_file = os.path.join(output_path, METRICS_FILE)
+    metrics = dict()
+    if os.path.exists(metrics_file):
+        with open(metrics_file, 'r') as infile:
+            metrics = json.load(infile)
+
+    metrics[section] = {
+        'info': info or dict(),
+        'phases': phases,
+        'total': get_total(phases)
+    }
+
+    with open(metrics_file, 'w') as outfile:
+        json.dump(metrics, outfile, indent=2, sort_keys=True)
+
+
+def load_metrics(example_path):
+    with open(os.path.join(example_path, METRICS_FILE), 'r') as infile:
+        return json.load(infile)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Traffic rollup of a generated example (ndb_rollup.npz): the total traffic and number of flows grouped by each of the
+dimensions ingress, egress, destination and shortest_path and by each pair of them. It is written by the generator
+while the flows are generated and answers aggregate questions (e.g., the traffic towards a destination leaving at a
+given egress) without reading the flows.
+
+For a group, e.g., 'egress|destination', the file contains the codes of all non-empty cells ('egress|destination:codes',
+one row per cell), their traffic ('egress|destination:traffic') and number of flows ('egress|destination:count'). The
+value of each code is stored in 'values:<dimension>'.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+from ndb_index import normalize
+
+ROLLUP_FILE = 'ndb_rollup.npz'
+DIMENSIONS = ['ingress', 'egress', 'destination', 'shortest_path']
+
+
+def get_groups():
+    groups = [()]
+    groups.extend((dimension, ) for dimension in DIMENSIONS)
+    groups.extend(itertools.combinations(DIMENSIONS, 2))
+    return groups
+
+
+class RollupWriter(object):
+    # accumulates the rollup chunk by chunk. Each group only holds its non-empty cells (a combination of codes encoded
+    # as a single integer) in sorted order together with their traffic and number of flows, such that the memory and
+    # the work per chunk do not depend on the number of possible cells (e.g., destinations x nodes).
+    def __init__(self, output_path, nodes, destinations):
+        self.output_file = os.path.join(output_path, ROLLUP_FILE)
+
+        self.node_index = dict((node, index) for index, node in enumerate(nodes))
+        self.destination_index = dict((destination, index) for index, destination in enumerate(destinations))
+        self.values = {
+            'ingress': list(nodes),
+            'egress': list(nodes),
+            'destination': list(destinations),
+            'shortest_path': [False, True]
+        }
+
+        self.cells = dict()
+        self.traffic = dict()
+        self.count = dict()
+        for group in get_groups():
+            self.cells[group] = np.zeros(0, dtype=np.int64)
+            self.traffic[group] = np.zeros(0, dtype=np.float64)
+            self.count[group] = np.zeros(0, dtype=np.int64)
+
+        # codes of the ingress, egress and shortest path flag of each path in the path table
+        self.path_codes = dict((dimension, list()) for dimension in ('ingress', 'egress', 'shortest_path'))
+
+    def write(self, flows, path_table):
+        # add a chunk of flows which refer to their paths by id in the given path table
+        for _, ingress, egress, _, shortest_path in path_table[len(self.path_codes['ingress']):]:
+            self.path_codes['ingress'].append(self.node_index[ingress])
+            self.path_codes['egress'].append(self.node_index[egress])
+            self.path_codes['shortest_path'].append(int(shortest_path))
+
+        path_ids = np.array([flow[0] for flow in flows], dtype=np.int64)
+        codes = dict((dimension, np.array(path_codes, dtype=np.int64)[path_ids])
+                     for dimension, path_codes in self.path_codes.iteritems())
+        codes['destination'] = np.array([self.destination_index[flow[1]] for flow in flows], dtype=np.int64)
+        traffic = np.array([flow[3] for flow in flows], dtype=np.float64)
+
+        for group in get_groups():
+            cells = np.zeros(len(flows), dtype=np.int64)
+            for dimension in group:
+                cells = cells * len(self.values[dimension]) + codes[dimension]
+            self.add_cells(group, cells, traffic)
+
+    def add_cells(self, group, cells, traffic):
+        # aggregate the cells of the chunk and merge them into the sorted cells of the group
+        chunk_cells, inverse = np.unique(cells, return_inverse=True)
+        chunk_traffic = np.bincount(inverse, weights=traffic, minlength=len(chunk_cells))
+        chunk_count = np.bincount(inverse, minlength=len(chunk_cells))
+
+        positions = np.searchsorted(self.cells[group], chunk_cells)
+        known = positions < len(self.cells[group])
+        known[known] = self.cells[group][positions[known]] == chunk_cells[known]
+        self.traffic[group][positions[known]] += chunk_traffic[known]
+        self.count[group][positions[known]] += chunk_count[known]
+
+        new = ~known
+        if new.any():
+            self.cells[group] = np.insert(self.cells[group], positions[new], chunk_cells[new])
+            self.traffic[group] = np.insert(self.traffic[group], positions[new], chunk_traffic[new])
+            self.count[group] = np.insert(self.count[group], positions[new], chunk_count[new])
+
+    def close(self):
+        arrays = dict()
+        for dimension, values in self.values.iteritems():
+            arrays['values:%s' % dimension] = np.array(values)
+
+        for group in get_groups():
+            name = '|'.join(group)
+            cells = self.cells[group]
+            codes = np.zeros((len(cells), len(group)), dtype=np.int64)
+            if group and len(cells):
+                codes[:] = np.array(np.unravel_index(cells, [len(self.values[dimension]) for dimension in group])).T
+            arrays['%s:codes' % name] = codes
+            arrays['%s:traffic' % name] = self.traffic[group]
+            arrays['%s:count' % name] = self.count[group]
+
+        np.savez(self.output_file, **arrays)
+
+
+class NDBRollup(object):
+    def __init__(self, example_path):
+        data = np.load(os.path.join(example_path, ROLLUP_FILE))
+
+        self.values = dict()
+        self.value_codes = dict()
+        for dimension in DIMENSIONS:
+            self.values[dimension] = data['values:%s' % dimension].tolist()
+            self.value_codes[dimension] = dict((normalize(dimension, value), code)
+                                               for code, value in enumerate(self.values[dimension]))
+
+        # group -> codes -> (traffic, number of flows)
+        self.cells = dict()
+        for group in get_groups():
+            name = '|'.join(group)
+            self.cells[group] = dict(
+                (tuple(codes), (traffic, count)) for codes, traffic, count in
+                itertools.izip(data['%s:codes' % name].tolist(), data['%s:traffic' % name].tolist(),
+                               data['%s:count' % name].tolist()))
+
+    def query(self, feature_values):
+        # traffic and number of flows which match all the given (feature, value) pairs. Only specs with at most two of
+        # the rollup dimensions can be answered, for all others a KeyError is raised.
+        for feature, _ in feature_values:
+            if feature not in DIMENSIONS:
+                raise KeyError('THE ROLLUP DOES NOT CONTAIN %s' % feature)
+
+        feature_values = sorted(feature_values, key=lambda feature_value: DIMENSIONS.index(feature_value[0]))
+        group = tuple(feature for feature, _ in feature_values)
+        if group not in self.cells:
+            raise KeyError('THE ROLLUP DOES NOT CONTAIN %s' % ', '.join(group))
+
+        codes = list()
+        for feature, value in feature_values:
+            code = self.value_codes[feature].get(normalize(feature, value))
+            if code is None:
+                return 0.0, 0
+            codes.append(code)
+
+        return self.cells[group].get(tuple(codes), (0.0, 0))
+
+    def get_group(self, *dimensions):
+        # the traffic and number of flows for each combination of values of the given dimensions
+        group = tuple(sorted(dimensions, key=DIMENSIONS.index))
+        return dict((tuple(self.values[dimension][code] for dimension, code in zip(group, codes)), cell)
+                    for codes, cell in self.cells[group].iteritems())
+
+
+def load_rollup(example_path):
+    return NDBRollup(example_path)
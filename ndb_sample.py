@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Traffic-weighted sampling of the flows of an example in a single pass (priority sampling). Each flow gets the priority
+traffic size / u with u drawn uniformly from (0, 1], the sample consists of the sample_size flows with the largest
+priorities and the threshold tau is the next largest priority. Flows with at least tau traffic are hence always sampled,
+the smaller flows with probability traffic size / tau.
+
+The weight of a sampled flow is max(traffic size, tau) / traffic size, i.e., the inverse of the probability with which
+it was sampled. The weighted sum of the traffic sizes (or the sum of the weights) of any set of sampled flows is an
+unbiased estimate of the traffic (or number of flows) of the same set of flows in the whole example. The variance of
+such a traffic estimate is estimated without bias by the sum of traffic size^2 * weight * (weight - 1) over the set.
+
+Only the candidates for the sample are kept while the flows are read, the flows are read from the memory mapped columns
+(ndb_columns), chunk by chunk from the stream (ndb_stream.out) or, if the example has neither, from the dump. The
+uniform draws are taken in the order of the flows, so the sample only depends on the seed and not on the chunks.
+"""
+
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import numpy as np
+
+from ndb_columns import CHUNK_SIZE, COLUMNS_DIR, load_columnar
+from ndb_stream import STREAM_FILE, iter_stream
+
+
+class PrioritySampler(object):
+    def __init__(self, sample_size, random_state):
+        if sample_size < 1:
+            raise ValueError('INVALID SAMPLE SIZE: %d' % (sample_size, ))
+        self.sample_size = sample_size
+        self.random_state = random_state
+
+        self.num_flows = 0
+        self.total_traffic = 0.0
+
+        # candidates: the sample_size + 1 largest priorities so far (and possibly some more which are dropped once
+        # there are twice as many), their position in the order of the flows and the flows themselves (if given)
+        self.priorities = np.zeros(0)
+        self.positions = np.zeros(0, dtype=np.int64)
+        self.items = list()
+
+    def get_threshold(self):
+        # smallest priority a flow needs to become a candidate
+        if len(self.priorities) <= self.sample_size:
+            return 0.0
+        return np.partition(self.priorities, len(self.priorities) - self.sample_size - 1)[-self.sample_size - 1]
+
+    def add(self, traffic_sizes, items=None):
+        # adds the next flows with the given traffic sizes, items are the flows (or anything else) which are returned
+        # for the sampled ones
+        traffic_sizes = np.asarray(traffic_sizes, dtype=np.float64)
+        priorities = traffic_sizes / (1.0 - self.random_state.uniform(0, 1, len(traffic_sizes)))
+        candidates = np.flatnonzero(priorities >= self.get_threshold())
+
+        self.priorities = np.r_[self.priorities, priorities[candidates]]
+        self.positions = np.r_[self.positions, self.num_flows + candidates]
+        if items is not None:
+            self.items.extend(items[i] for i in candidates.tolist())
+        self.num_flows += len(traffic_sizes)
+        self.total_traffic += traffic_sizes.sum()
+
+        if len(self.priorities) > 2 * (self.sample_size + 1):
+            self.keep(self.sample_size + 1)
+
+    def keep(self, num_candidates):
+        keep = np.sort(np.argpartition(-self.priorities, num_candidates - 1)[:num_candidates])
+        self.priorities = self.priorities[keep]
+        self.positions = self.positions[keep]
+        if self.items:
+            self.items = [self.items[i] for i in keep.tolist()]
+
+    def get_sample(self, traffic_sizes):
+        # returns the positions and, if given, the items of the sampled flows in the order of the flows, together with
+        # their weights. traffic_sizes is a function returning the traffic sizes of the sampled items or positions.
+        threshold = 0.0
+        if len(self.priorities) > self.sample_size:
+            threshold = self.get_threshold()
+            self.keep(self.sample_size + 1)
+            sampled = np.flatnonzero(self.priorities > threshold)[:self.sample_size]
+            self.priorities = self.priorities[sampled]
+            self.positions = self.positions[sampled]
+            if self.items:
+                self.items = [self.items[i] for i in sampled.tolist()]
+
+        sizes = np.asarray(traffic_sizes(self.items if self.items else self.positions), dtype=np.float64)
+        weights = np.ones(len(sizes))
+        if threshold > 0:
+            weights = np.maximum(sizes, threshold) / sizes
+        self.threshold = threshold
+        return self.positions, self.items, weights
+
+
+def compact_paths(flows, path_table):
+    # replaces the path ids of the flows by ids into a path table which only contains the paths the flows use
+    path_ids = dict()
+    compacted = list()
+    for flow in flows:
+        if flow[0] not in path_ids:
+            path_ids[flow[0]] = len(compacted)
+            compacted.append(path_table[flow[0]])
+    return [(path_ids[flow[0]], ) + tuple(flow[1:]) for flow in flows], compacted
+
+
+def sample_columns(example_path, sample_size, random_state):
+    columns = load_columnar(example_path)
+    sampler = PrioritySampler(sample_size, random_state)
+    for start in xrange(0, len(columns), CHUNK_SIZE):
+        sampler.add(columns.traffic_size[start:start + CHUNK_SIZE])
+    rows, _, weights = sampler.get_sample(lambda rows: columns.traffic_size[rows])
+
+    # the paths of the sampled flows as entries of a path table (path, ingress, egress, length, is shortest path)
+    path_table = dict()
+    for path_id in np.unique(columns.path[rows]).tolist():
+        path = columns.get_path(path_id)
+        shortest_path = bool(columns.path_shortest[path_id]) if columns.path_shortest is not None else None
+        path_table[path_id] = (path, path[0], path[-1], len(path) - 1, shortest_path)
+
+    flows = [(path_id, columns.destinations[destination_id], columns.prefixes[prefix_id], traffic_size, features)
+             for path_id, destination_id, prefix_id, traffic_size, features in
+             zip(columns.path[rows].tolist(), columns.destination[rows].tolist(), columns.prefix[rows].tolist(),
+                 columns.traffic_size[rows].tolist(), np.asarray(columns.features[rows]).tolist())]
+    flows, path_table = compact_paths(flows, path_table)
+
+    header = {
+        'destination_to_prefix': columns.get_destination_to_prefix(),
+        'prefix_to_destination': columns.get_prefix_to_destination(),
+        'node_to_name': columns.node_to_name,
+        'name_to_node': dict((name, node) for node, name in columns.node_to_name.iteritems())
+    }
+    return header, flows, path_table, weights, sampler
+
+
+def sample_chunks(chunks, sample_size, random_state):
+    # chunks yields (header, path table, flows) as iter_stream
+    sampler = PrioritySampler(sample_size, random_state)
+    header, path_table = dict(), list()
+    for header, path_table, flows in chunks:
+        sampler.add([flow[3] for flow in flows], flows)
+    _, flows, weights = sampler.get_sample(lambda flows: [flow[3] for flow in flows])
+
+    flows, path_table = compact_paths(flows, path_table)
+    return header, flows, path_table, weights, sampler
+
+
+def iter_dump(data_path):
+    # the whole dump is read at once, it is only used if the example has neither columns nor a stream
+    with open(data_path, 'rb') as infile:
+        data = pickle.load(infile)
+    if 'classes' in data:
+        raise ValueError('FORWARDING EQUIVALENCE CLASSES CANNOT BE SAMPLED')
+    yield data, data['path_table'], data['paths']
+
+
+def sample_example(example_path, sample_size, seed=None, data_file='ndb_dump.out'):
+    # returns the sample in the same form as the content of ndb_dump.out (with a path table containing only the sampled
+    # paths), the weight of each sampled flow and the number of flows, total traffic and threshold of the example
+    random_state = np.random.RandomState(seed)
+    if os.path.isdir(os.path.join(example_path, COLUMNS_DIR)):
+        header, flows, path_table, weights, sampler = sample_columns(example_path, sample_size, random_state)
+    elif os.path.exists(os.path.join(example_path, STREAM_FILE)):
+        header, flows, path_table, weights, sampler = sample_chunks(iter_stream(example_path), sample_size,
+                                                                    random_state)
+    else:
+        header, flows, path_table, weights, sampler = sample_chunks(iter_dump(os.path.join(example_path, data_file)),
+                                                                    sample_size, random_state)
+
+    data = {
+        'destination_to_prefix': header['destination_to_prefix'],
+        'prefix_to_destination': header['prefix_to_destination'],
+        'node_to_name': header['node_to_name'],
+        'name_to_node': header['name_to_node'],
+        'paths': flows,
+        'path_table': path_table
+    }
+    info = {
+        'num_flows': sampler.num_flows,
+        'total_traffic': sampler.total_traffic,
+        'threshold': sampler.threshold
+    }
+    return data, weights, info
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Storage of a generated example partitioned by destination (directory ndb_shards), such that the flows of a few
+destinations can be loaded without reading the others:
+
+    meta.json               version, number of shards and flows, node_to_name and name_to_node
+    shard_<i>.out           sequence of pickled segments, each holding flows of a single destination together with the
+                            entries of the path table they use ({'path_table': [(path id, entry)], 'paths': flows})
+    index.npz               destinations (sorted), number of flows (rows) and total traffic (traffic) of each destination
+                            and the segments of all destinations one after the other (segment_shards, segment_offsets
+                            with the byte offset in the shard and segment_lengths), destination i owns the segments
+                            segment_starts[i] to segment_starts[i + 1]
+    prefixes.npz            prefixes of all destinations one after the other (destination i owns prefix_starts[i] to
+                            prefix_starts[i + 1]) and the order of the prefixes when they are sorted (prefix_order)
+
+The flows are written chunk by chunk while they are generated, each chunk adds one segment per destination it contains.
+The shard of a destination is given by its index in the sorted destinations, so all segments of a destination are in
+the same shard. load_shards returns the selected flows in the same form as ndb_dump.out.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import numpy as np
+
+SHARDS_DIR = 'ndb_shards'
+SHARDS_VERSION = 1
+
+NUM_SHARDS = 16
+
+
+class ShardWriter(object):
+    def __init__(self, output_path, header, num_shards=NUM_SHARDS):
+        self.directory = os.path.join(output_path, SHARDS_DIR)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.header = header
+        self.destinations = sorted(header['destination_to_prefix'])
+        self.destination_ids = dict((destination, i) for i, destination in enumerate(self.destinations))
+        self.num_shards = max(1, min(num_shards, len(self.destinations)))
+        self.shard_files = [open(os.path.join(self.directory, 'shard_%d.out' % (shard, )), 'wb')
+                            for shard in range(self.num_shards)]
+
+        self.rows = np.zeros(len(self.destinations), dtype=np.int64)
+        self.traffic = np.zeros(len(self.destinations))
+
+        # (destination id, shard, offset, length) of each segment in the order they were written
+        self.segments = list()
+
+    def write(self, flows, path_table):
+        # group the flows of the chunk by destination (in the order in which the destinations first appear)
+        destination_flows = OrderedDict()
+        for flow in flows:
+            destination_flows.setdefault(flow[1], list()).append(flow)
+
+        for destination, tmp_flows in destination_flows.iteritems():
+            destination_id = self.destination_ids[destination]
+            shard = destination_id % self.num_shards
+            path_ids = sorted(set(flow[0] for flow in tmp_flows))
+            segment = {
+                'path_table': [(path_id, path_table[path_id]) for path_id in path_ids],
+                'paths': tmp_flows
+            }
+
+            shard_file = self.shard_files[shard]
+            offset = shard_file.tell()
+            pickle.dump(segment, shard_file, pickle.HIGHEST_PROTOCOL)
+            self.segments.append((destination_id, shard, offset, shard_file.tell() - offset))
+
+            self.rows[destination_id] += len(tmp_flows)
+            self.traffic[destination_id] += sum(flow[3] for flow in tmp_flows)
+
+    def close(self):
+        for shard_file in self.shard_files:
+            shard_file.close()
+
+        segments = np.array(self.segments, dtype=np.int64).reshape(-1, 4)
+        order = np.argsort(segments[:, 0], kind='mergesort')
+        segments = segments[order]
+        segment_starts = np.zeros(len(self.destinations) + 1, dtype=np.int64)
+        segment_starts[1:] = np.cumsum(np.bincount(segments[:, 0], minlength=len(self.destinations)))
+        np.savez(os.path.join(self.directory, 'index.npz'), destinations=np.array(self.destinations), rows=self.rows,
+                 traffic=self.traffic, segment_starts=segment_starts, segment_shards=segments[:, 1],
+                 segment_offsets=segments[:, 2], segment_lengths=segments[:, 3])
+
+        destination_to_prefix = self.header['destination_to_prefix']
+        prefixes = np.array([prefix for destination in self.destinations
+                             for prefix in destination_to_prefix[destination]])
+        prefix_starts = np.zeros(len(self.destinations) + 1, dtype=np.int64)
+        prefix_starts[1:] = np.cumsum([len(destination_to_prefix[destination]) for destination in self.destinations])
+        np.savez(os.path.join(self.directory, 'prefixes.npz'), prefixes=prefixes, prefix_starts=prefix_starts,
+                 prefix_order=np.argsort(prefixes, kind='mergesort'))
+
+        meta = {
+            'version': SHARDS_VERSION,
+            'num_shards': self.num_shards,
+            'num_flows': int(self.rows.sum()),
+            'node_to_name': self.header['node_to_name'],
+            'name_to_node': self.header['name_to_node']
+        }
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as outfile:
+            json.dump(meta, outfile)
+
+
+class ShardIndex(object):
+    def __init__(self, shards_path):
+        self.directory = shards_path
+        with open(os.path.join(shards_path, 'meta.json'), 'r') as infile:
+            self.meta = json.load(infile)
+        if self.meta['version'] != SHARDS_VERSION:
+            raise ValueError('UNSUPPORTED SHARDS VERSION %s IN %s' % (self.meta['version'], shards_path))
+
+        index = np.load(os.path.join(shards_path, 'index.npz'))
+        self.destinations = index['destinations']
+        self.rows = index['rows']
+        self.traffic = index['traffic']
+        self.segment_starts = index['segment_starts']
+        self.segment_shards = index['segment_shards']
+        self.segment_offsets = index['segment_offsets']
+        self.segment_lengths = index['segment_lengths']
+
+        prefixes = np.load(os.path.join(shards_path, 'prefixes.npz'))
+        self.prefixes = prefixes['prefixes']
+        self.prefix_starts = prefixes['prefix_starts']
+        self.prefix_order = prefixes['prefix_order']
+
+    def get_destination_id(self, destination):
+        i = int(np.searchsorted(self.destinations, destination))
+        if i == len(self.destinations) or self.destinations[i] != destination:
+            raise ValueError('UNKNOWN DESTINATION: %s' % (destination, ))
+        return i
+
+    def get_prefix_destination_id(self, prefix):
+        # id of the destination the prefix belongs to
+        i = int(np.searchsorted(self.prefixes, prefix, sorter=self.prefix_order))
+        if i == len(self.prefixes) or self.prefixes[self.prefix_order[i]] != prefix:
+            raise ValueError('UNKNOWN PREFIX: %s' % (prefix, ))
+        return int(np.searchsorted(self.prefix_starts, self.prefix_order[i], side='right')) - 1
+
+    def get_prefixes(self, destination_id):
+        return self.prefixes[self.prefix_starts[destination_id]:self.prefix_starts[destination_id + 1]].tolist()
+
+    def get_summary(self, destination):
+        # number of flows and total traffic of a destination, without reading any flows
+        destination_id = self.get_destination_id(destination)
+        return int(self.rows[destination_id]), float(self.traffic[destination_id])
+
+    def iter_segments(self, destination_ids):
+        # yields (destination id, segment) for all segments of the given destinations, each shard is opened once
+        segments = sorted((self.segment_shards[s], self.segment_offsets[s], self.segment_lengths[s], destination_id)
+                          for destination_id in destination_ids
+                          for s in range(self.segment_starts[destination_id], self.segment_starts[destination_id + 1]))
+
+        shard, infile = None, None
+        try:
+            for segment_shard, offset, length, destination_id in segments:
+                if segment_shard != shard:
+                    if infile:
+                        infile.close()
+                    shard = segment_shard
+                    infile = open(os.path.join(self.directory, 'shard_%d.out' % (shard, )), 'rb')
+                infile.seek(offset)
+                yield destination_id, pickle.loads(infile.read(length))
+        finally:
+            if infile:
+                infile.close()
+
+
+def load_shards(shards_path, destinations=None, prefixes=None):
+    # returns all flows of the given destinations and the flows of the given prefixes in the same form as the content
+    # of ndb_dump.out (all flows if neither is given). Only the segments of the destinations of these flows are read,
+    # the path table and the mappings only contain the selected paths, destinations and prefixes.
+    index = ShardIndex(shards_path)
+
+    if destinations is None and prefixes is None:
+        destination_ids = set(range(len(index.destinations)))
+    else:
+        destination_ids = set(index.get_destination_id(destination) for destination in destinations or list())
+    prefixes = set(prefixes or list())
+    prefix_destination_ids = set(index.get_prefix_destination_id(prefix) for prefix in prefixes)
+
+    path_ids = dict()
+    path_table = list()
+    flows = list()
+    for destination_id, segment in index.iter_segments(destination_ids | prefix_destination_ids):
+        if destination_id not in destination_ids:
+            segment['paths'] = [flow for flow in segment['paths'] if flow[2] in prefixes]
+            used_paths = set(flow[0] for flow in segment['paths'])
+            segment['path_table'] = [(path_id, entry) for path_id, entry in segment['path_table']
+                                     if path_id in used_paths]
+
+        for path_id, entry in segment['path_table']:
+            if path_id not in path_ids:
+                path_ids[path_id] = len(path_table)
+                path_table.append(entry)
+        flows.extend((path_ids[flow[0]], ) + tuple(flow[1:]) for flow in segment['paths'])
+
+    destination_to_prefix = dict()
+    for destination_id in sorted(destination_ids | prefix_destination_ids):
+        destination_prefixes = index.get_prefixes(destination_id)
+        if destination_id not in destination_ids:
+            destination_prefixes = [prefix for prefix in destination_prefixes if prefix in prefixes]
+        destination_to_prefix[index.destinations[destination_id].tolist()] = destination_prefixes
+    prefix_to_destination = dict((prefix, destination) for destination, destination_prefixes in
+                                 destination_to_prefix.iteritems() for prefix in destination_prefixes)
+
+    return {
+        'destination_to_prefix': destination_to_prefix,
+        'prefix_to_destination': prefix_to_destination,
+        'node_to_name': index.meta['node_to_name'],
+        'name_to_node': index.meta['name_to_node'],
+        'paths': flows,
+        'path_table': path_table
+    }
+
+
+def select_flows(data, destinations=None, prefixes=None):
+    # the same selection as load_shards on the content of ndb_dump.out, which has to be read completely
+    if 'classes' in data:
+        raise ValueError('DESTINATIONS AND PREFIXES CANNOT BE SELECTED FROM FORWARDING EQUIVALENCE CLASSES')
+    destinations = set(destinations or list())
+    prefixes = set(prefixes or list())
+    for destination in destinations:
+        if destination not in data['destination_to_prefix']:
+            raise ValueError('UNKNOWN DESTINATION: %s' % (destination, ))
+    for prefix in prefixes:
+        if prefix not in data['prefix_to_destination']:
+            raise ValueError('UNKNOWN PREFIX: %s' % (prefix, ))
+
+    selected = dict(data)
+    selected['paths'] = [flow for flow in data['paths'] if flow[1] in destinations or flow[2] in prefixes]
+    selected['destination_to_prefix'] = dict((destination, list(data['destination_to_prefix'][destination]))
+                                             for destination in destinations)
+    for prefix in prefixes:
+        destination = data['prefix_to_destination'][prefix]
+        if destination not in destinations:
+            selected['destination_to_prefix'].setdefault(destination, list()).append(prefix)
+    selected['prefix_to_destination'] = dict((prefix, destination) for destination, destination_prefixes in
+                                             selected['destination_to_prefix'].iteritems()
+                                             for prefix in destination_prefixes)
+    return selected
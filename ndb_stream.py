@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Append-only chunked storage of a generated example (ndb_stream.out). The file is a sequence of pickled records: first a
+header with the same mappings as in ndb_dump.out (destination_to_prefix, prefix_to_destination, node_to_name and
+name_to_node), followed by one record per chunk of flows. Each chunk contains the flows as in ndb_dump.out and the
+entries which were added to the path table since the previous chunk. Hence, the file can be written while the flows
+are generated and read without ever holding more than one chunk in memory.
+"""
+
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+STREAM_FILE = 'ndb_stream.out'
+STREAM_VERSION = 1
+
+
+class StreamWriter(object):
+    def __init__(self, output_path, header):
+        self.outfile = open(os.path.join(output_path, STREAM_FILE), 'wb')
+        self.num_paths = 0
+
+        header = dict(header)
+        header['version'] = STREAM_VERSION
+        pickle.dump(header, self.outfile, pickle.HIGHEST_PROTOCOL)
+
+    def write(self, flows, path_table):
+        chunk = {
+            'path_table': path_table[self.num_paths:],
+            'paths': flows
+        }
+        pickle.dump(chunk, self.outfile, pickle.HIGHEST_PROTOCOL)
+        self.outfile.flush()
+
+        self.num_paths = len(path_table)
+
+    def close(self):
+        self.outfile.close()
+
+
+def iter_stream(example_path):
+    # yields (header, path table, flows) for each chunk, the path table contains all paths up to this chunk
+    with open(os.path.join(example_path, STREAM_FILE), 'rb') as infile:
+        header = pickle.load(infile)
+
+        path_table = list()
+        while True:
+            try:
+                chunk = pickle.load(infile)
+            except EOFError:
+                break
+
+            path_table.extend(chunk['path_table'])
+            yield header, path_table, chunk['paths']
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Compiled topology: the nodes, links and shortest path distances of a graph as numpy arrays in a single npz file, which
+loads much faster than parsing the graphml file or unpickling the NetworkX graph:
+
+    nodes               node names, all node ids are indices into them
+    edge_sources        node id of the first end of each link (parallel links are kept)
+    edge_targets        node id of the second end of each link
+    edge_weights        weight of each link (1 if the link has no weight)
+    adjacency_offsets   start of the neighbors of each node in adjacency_nodes (one more entry than there are nodes)
+    adjacency_nodes     node ids of the neighbors of all nodes, one node after the other (CSR)
+    adjacency_weights   weight of the link to each neighbor (the smallest one for parallel links)
+    distances           length of the shortest path between any two nodes (inf if there is none)
+    meta                json with the version, the graph type and the attributes of the graph, nodes and links
+
+The graphml files are compiled once and cached by the hash of their content (see load_graphml). to_networkx rebuilds
+the NetworkX graph with all attributes for the code which still needs one. The nodes and links are kept in the order of
+the graphml file and added in that order, such that the graph is identical to the one returned by nx.read_graphml, down
+to the order of the neighbors (which decides ties between equal cost paths). A generated example contains its compiled
+topology in ndb_topo.npz next to ndb_topo.out.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import networkx as nx
+from networkx.readwrite.graphml import GraphMLReader
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+TOPOLOGY_FILE = 'ndb_topo.npz'
+TOPOLOGY_VERSION = 1
+
+
+class CompiledTopology(object):
+    def __init__(self, nodes, edge_sources, edge_targets, edge_weights, distances=None, directed=False,
+                 multigraph=False, attributes=None):
+        self.nodes = list(nodes)
+        self.node_index = dict((node, index) for index, node in enumerate(self.nodes))
+        self.edge_sources = np.asarray(edge_sources, dtype=np.int64)
+        self.edge_targets = np.asarray(edge_targets, dtype=np.int64)
+        self.edge_weights = np.asarray(edge_weights, dtype=np.float64)
+        self.directed = directed
+        self.multigraph = multigraph
+
+        # graph -> attributes, nodes -> attributes of each node, edges -> attributes of each link, keys -> key of each
+        # link (None if NetworkX picks the key)
+        self.attributes = attributes or {'graph': dict(), 'nodes': [dict() for _ in self.nodes],
+                                         'edges': [dict() for _ in self.edge_sources],
+                                         'keys': [None for _ in self.edge_sources]}
+
+        # each link in both directions (unless the graph is directed), sorted by source and target, with the smallest
+        # weight of parallel links
+        sources, targets, weights = self.edge_sources, self.edge_targets, self.edge_weights
+        if not directed:
+            sources, targets = np.r_[sources, targets], np.r_[targets, sources]
+            weights = np.r_[weights, weights]
+        order = np.lexsort((weights, targets, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+        first = np.r_[True, (np.diff(sources) != 0) | (np.diff(targets) != 0)] if len(sources) else np.zeros(0, bool)
+
+        self.adjacency_nodes = targets[first]
+        self.adjacency_weights = weights[first]
+        self.adjacency_offsets = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        self.adjacency_offsets[1:] = np.cumsum(np.bincount(sources[first], minlength=len(self.nodes)))
+
+        self.distances = distances if distances is not None else self.get_distances()
+
+    def get_distances(self):
+        # all pairs shortest path lengths with one Dijkstra per source on the adjacency matrix
+        num_nodes = len(self.nodes)
+        if not num_nodes:
+            return np.zeros((0, 0))
+        adjacency = scipy.sparse.csr_matrix((self.adjacency_weights, self.adjacency_nodes, self.adjacency_offsets),
+                                            shape=(num_nodes, num_nodes))
+        return scipy.sparse.csgraph.shortest_path(adjacency, method='D', directed=True)
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.edge_sources)
+
+    def get_neighbors(self, node_id):
+        # node ids of the neighbors of a node and the weight of the link to each of them
+        start, end = self.adjacency_offsets[node_id], self.adjacency_offsets[node_id + 1]
+        return self.adjacency_nodes[start:end], self.adjacency_weights[start:end]
+
+    def get_distance(self, n1, n2):
+        return self.distances[self.node_index[n1], self.node_index[n2]]
+
+    @classmethod
+    def from_networkx(cls, graph, nodes=None, edges=None):
+        # nodes and edges (n1, n2, key) give the order in which they were added to the graph, by default the order in
+        # which the graph returns them
+        if nodes is None:
+            nodes = graph.nodes()
+        if edges is None:
+            edges = graph.edges(keys=True) if graph.is_multigraph() else [(n1, n2, None) for n1, n2 in graph.edges()]
+        node_index = dict((node, index) for index, node in enumerate(nodes))
+
+        if graph.is_multigraph():
+            edge_data = [graph[n1][n2][key] for n1, n2, key in edges]
+        else:
+            edge_data = [graph[n1][n2] for n1, n2, _ in edges]
+        attributes = {
+            'graph': dict(graph.graph),
+            'nodes': [graph.node[node] for node in nodes],
+            'edges': edge_data,
+            'keys': [key for _, _, key in edges]
+        }
+
+        return cls(nodes,
+                   [node_index[n1] for n1, _, _ in edges],
+                   [node_index[n2] for _, n2, _ in edges],
+                   [data.get('weight', 1) for data in edge_data],
+                   directed=graph.is_directed(),
+                   multigraph=graph.is_multigraph(),
+                   attributes=attributes)
+
+    def to_networkx(self):
+        # NetworkX graph of the same type with the same nodes, links and attributes. As in nx.read_graphml, the links
+        # are first added to a multigraph which is only then turned into a graph without parallel links.
+        graph = nx.MultiDiGraph() if self.directed else nx.MultiGraph()
+        graph.graph.update(self.attributes['graph'])
+        for node, data in zip(self.nodes, self.attributes['nodes']):
+            graph.add_node(node, data)
+        for n1, n2, key, data in zip(self.edge_sources.tolist(), self.edge_targets.tolist(), self.attributes['keys'],
+                                     self.attributes['edges']):
+            graph.add_edge(self.nodes[n1], self.nodes[n2], key=key, attr_dict=data)
+
+        if not self.multigraph:
+            return nx.DiGraph(graph) if self.directed else nx.Graph(graph)
+        return graph
+
+    def save(self, topology_file):
+        meta = {
+            'version': TOPOLOGY_VERSION,
+            'directed': self.directed,
+            'multigraph': self.multigraph,
+            'attributes': self.attributes
+        }
+        np.savez(topology_file, nodes=np.array(self.nodes), edge_sources=self.edge_sources,
+                 edge_targets=self.edge_targets, edge_weights=self.edge_weights,
+                 adjacency_offsets=self.adjacency_offsets, adjacency_nodes=self.adjacency_nodes,
+                 adjacency_weights=self.adjacency_weights, distances=self.distances, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, topology_file):
+        data = np.load(topology_file)
+        meta = json.loads(data['meta'].item())
+        if meta['version'] != TOPOLOGY_VERSION:
+            raise ValueError('UNSUPPORTED TOPOLOGY VERSION %s IN %s' % (meta['version'], topology_file))
+        return cls(data['nodes'].tolist(), data['edge_sources'], data['edge_targets'], data['edge_weights'],
+                   distances=data['distances'], directed=meta['directed'], multigraph=meta['multigraph'],
+                   attributes=meta['attributes'])
+
+
+class OrderedGraphMLReader(GraphMLReader):
+    # graphml reader which records the nodes and links (with the key they got) in the order of the file
+    def __init__(self, node_type=str):
+        GraphMLReader.__init__(self, node_type=node_type)
+        self.nodes = list()
+        self.edges = list()
+
+    def add_node(self, G, node_xml, graphml_keys):
+        GraphMLReader.add_node(self, G, node_xml, graphml_keys)
+        self.nodes.append(self.node_type(node_xml.get('id')))
+
+    def add_edge(self, G, edge_element, graphml_keys):
+        # the key is the id of the link, its attribute key or the one NetworkX picks for a multigraph
+        source = self.node_type(edge_element.get('source'))
+        target = self.node_type(edge_element.get('target'))
+        key = edge_element.get('id')
+        if key is None:
+            key = self.decode_data_elements(graphml_keys, edge_element).get('key')
+        if key is None:
+            keys = G.adj[source].get(target, dict())
+            key = len(keys)
+            while key in keys:
+                key += 1
+
+        GraphMLReader.add_edge(self, G, edge_element, graphml_keys)
+        self.edges.append((source, target, key))
+
+
+def compile_graphml(graph_file):
+    reader = OrderedGraphMLReader()
+    graph = list(reader(path=graph_file))[0]
+    return CompiledTopology.from_networkx(graph, reader.nodes, reader.edges)
+
+
+def get_content_hash(graph_file):
+    content_hash = hashlib.sha1()
+    with open(graph_file, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def get_cache_file(cache_dir, graph_file):
+    # the compiled topology is identified by the content of the graphml file, not its path or modification time
+    return os.path.join(cache_dir, '%s-%s.npz' % (os.path.basename(graph_file), get_content_hash(graph_file)))
+
+
+def load_graphml(graph_file, cache_dir='.ndb_cache'):
+    # returns the compiled topology of a graphml file, it is only compiled if there is no cached topology for the same
+    # content. Without a cache directory, the file is always compiled.
+    if not cache_dir:
+        return compile_graphml(graph_file)
+
+    cache_file = get_cache_file(cache_dir, graph_file)
+    if os.path.exists(cache_file):
+        return CompiledTopology.load(cache_file)
+
+    topology = compile_graphml(graph_file)
+
+    # write to a temporary file first, such that concurrent runs never read a partially written cache
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_file = '%s.%d.tmp.npz' % (cache_file[:-len('.npz')], os.getpid())
+    topology.save(tmp_file)
+    os.rename(tmp_file, cache_file)
+
+    return topology
+
+
+def load_topology(example_path, topo_file='ndb_topo.out'):
+    # compiled topology of a generated example, older examples only contain the pickled graph which is then compiled
+    topology_file = os.path.join(example_path, TOPOLOGY_FILE)
+    if os.path.exists(topology_file):
+        return CompiledTopology.load(topology_file)
+    return CompiledTopology.from_networkx(nx.read_gpickle(os.path.join(example_path, topo_file)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parser.add_argument('-t', '--topo', help='name of the file containing the graph dump', type=str,
+                        default='ndb_topo.out')
+    parsed_args = parser.parse_args()
+
+    # compile the topology of an existing example
+    load_topology(parsed_args.path, parsed_args.topo).save(os.path.join(parsed_args.path, TOPOLOGY_FILE))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Author: Ruediger Birkner (Networked Systems Group at ETH Zurich)
+
+"""
+Tree summarizer over the flows of a loaded example, configured by the summarizer_conf of its config.json. Each node of
+the tree is a spec, i.e., a conjunction of feature values, together with the traffic and number of flows matching it.
+A node is split on the feature which separates its flows best and gets one child for each of the values carrying the
+most traffic (splitting_mode traffic_size) or flows (splitting_mode num_flows).
+
+The aggregates of all candidate features of a node are computed in a single pass over the flows of the node by grouping
+their codes (see ndb_index), hence building a tree of depth d touches each flow at most d times per feature.
+
+With a positive sampling_rate, the tree is built on a sample of that fraction of the flows drawn with probability
+proportional to their traffic. The traffic of each node is then estimated from the number of sampled flows (each draw
+stands for total traffic / sample size) and reported together with the half-width of its 95% confidence interval.
+The same holds for a sample which was already drawn while loading (see load_sample and ndb_sample), its flows are
+weighted by the given weights.
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+
+import numpy as np
+
+from ndb_columns import load_columnar
+from ndb_index import NDBIndex
+from load_example import NDBTable, load_example, load_sample
+
+SUMMARY_MODES = ['tree']
+TREE_MODES = ['balanced', 'greedy']
+SPLITTING_MODES = ['traffic_size', 'num_flows']
+
+
+class SummaryNode(object):
+    def __init__(self, spec, positions, traffic, num_flows, error=0.0):
+        self.spec = spec
+        self.positions = positions
+        self.traffic = traffic
+        self.num_flows = num_flows
+        self.error = error
+
+        self.split_feature = None
+        self.children = list()
+
+    def get_leaves(self):
+        if not self.children:
+            return [self]
+        leaves = list()
+        for child in self.children:
+            leaves.extend(child.get_leaves())
+        return leaves
+
+    def __str__(self):
+        spec = ', '.join('%s=%s' % (feature, value) for feature, value in self.spec) or 'all flows'
+        output = '%s: %.1f traffic, %d flows' % (spec, self.traffic, self.num_flows)
+        if self.error:
+            output += ' (+/- %.1f)' % self.error
+        return output
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Summarizer(object):
+    def __init__(self, features, summary_mode='tree', tree_mode='balanced', splitting_mode='traffic_size',
+                 sampling_rate=-1, depth=3, branching=3, max_nodes=20, seed=None):
+        if summary_mode not in SUMMARY_MODES:
+            raise ValueError('UNKNOWN SUMMARY MODE: %s' % summary_mode)
+        if tree_mode not in TREE_MODES:
+            raise ValueError('UNKNOWN TREE MODE: %s' % tree_mode)
+        if splitting_mode not in SPLITTING_MODES:
+            raise ValueError('UNKNOWN SPLITTING MODE: %s' % splitting_mode)
+
+        self.features = list(features)
+        self.summary_mode = summary_mode
+        self.tree_mode = tree_mode
+        self.splitting_mode = splitting_mode
+        self.sampling_rate = sampling_rate
+
+        # balanced trees are expanded level by level up to the given depth, greedy trees always split the leaf with the
+        # most traffic until they contain max_nodes nodes
+        self.depth = depth
+        self.branching = branching
+        self.max_nodes = max_nodes
+        self.random_state = np.random.RandomState(seed)
+
+    @classmethod
+    def from_config(cls, config, seed=None):
+        # config is either the content of a config.json or the path to it
+        if isinstance(config, basestring):
+            with open(config, 'r') as infile:
+                config = json.load(infile)
+        return cls(config['features'], seed=seed, **config.get('summarizer_conf', dict()))
+
+    def get_sample(self, index):
+        # positions of the flows the tree is built on, with the traffic and number of flows each of them stands for
+        self.total_traffic = index.traffic_sizes.sum()
+        self.sample_size = 0
+        if self.sampling_rate <= 0 or self.sampling_rate >= 1 or not self.total_traffic:
+            return np.arange(index.num_flows), index.traffic_sizes, np.ones(index.num_flows)
+
+        self.sample_size = max(1, int(math.ceil(self.sampling_rate * index.num_flows)))
+        rows = self.random_state.choice(index.num_flows, self.sample_size, p=index.traffic_sizes / self.total_traffic)
+        traffic = np.empty(self.sample_size)
+        traffic.fill(self.total_traffic / self.sample_size)
+        return rows, traffic, traffic / index.traffic_sizes[rows]
+
+    def get_weighted_sample(self, index, weights):
+        # all flows of a weighted sample, the variance of the traffic of each node is estimated from its flows
+        traffic = index.traffic_sizes * weights
+        self.variances = index.traffic_sizes ** 2 * weights * (weights - 1)
+        return np.arange(index.num_flows), traffic, np.asarray(weights, dtype=np.float64)
+
+    def get_error(self, traffic, positions):
+        # half-width of the 95% confidence interval of an estimated traffic
+        if self.variances is not None:
+            return 1.96 * math.sqrt(self.variances[positions].sum())
+        if not self.sample_size:
+            return 0.0
+        share = min(1.0, traffic / self.total_traffic)
+        return 1.96 * self.total_traffic * math.sqrt(share * (1 - share) / self.sample_size)
+
+    def get_node(self, spec, positions):
+        traffic = self.traffic[positions].sum()
+        num_flows = int(round(self.num_flows[positions].sum()))
+        return SummaryNode(spec, positions, traffic, num_flows, self.get_error(traffic, positions))
+
+    def split(self, node):
+        # split the node on the feature whose largest value is the largest (in traffic or flows, depending on the
+        # splitting mode), features which have a single value in the node do not split it
+        used_features = set(feature for feature, _ in node.spec)
+        weights = self.traffic if self.splitting_mode == 'traffic_size' else self.num_flows
+        node_weights = weights[node.positions]
+
+        best = None
+        for feature in self.features:
+            if feature in used_features:
+                continue
+            codes = self.codes[feature][node.positions]
+            sizes = np.bincount(codes, weights=node_weights, minlength=len(self.values[feature]))
+            if np.count_nonzero(sizes) < 2:
+                continue
+            if best is None or sizes.max() > best[0]:
+                best = (sizes.max(), feature, codes, sizes)
+
+        if best is None:
+            return
+        _, feature, codes, sizes = best
+
+        node.split_feature = feature
+        order = np.argsort(-sizes, kind='mergesort')
+        for code in order[:self.branching]:
+            if not sizes[code]:
+                break
+            child_spec = node.spec + [(feature, self.values[feature][code])]
+            node.children.append(self.get_node(child_spec, node.positions[codes == code]))
+
+    def summarize(self, data, weights=None):
+        # data is either a list of NDBEntry or an NDBTable as returned by load_example or an NDBIndex, returns the root
+        # of the tree. With the weights of a sample (as returned by load_sample), the sampling rate is ignored.
+        if isinstance(data, NDBIndex):
+            index = data
+        elif isinstance(data, NDBTable):
+            index = NDBIndex.from_table(data)
+        else:
+            index = NDBIndex.from_entries(data)
+        self.features = [feature for feature in self.features if feature in index.codes]
+
+        self.variances = None
+        if weights is not None:
+            rows, self.traffic, self.num_flows = self.get_weighted_sample(index, weights)
+        else:
+            rows, self.traffic, self.num_flows = self.get_sample(index)
+
+        # codes of the sampled flows, such that each node only holds positions in the sample
+        self.codes = dict((feature, index.codes[feature][rows]) for feature in self.features)
+        self.values = dict((feature, index.values[feature]) for feature in self.features)
+
+        root = self.get_node(list(), np.arange(len(rows)))
+        if self.tree_mode == 'balanced':
+            level = [root]
+            for _ in range(self.depth):
+                next_level = list()
+                for node in level:
+                    self.split(node)
+                    next_level.extend(node.children)
+                level = next_level
+        else:
+            num_nodes = 1
+            leaves = [(-root.traffic, 0, root)]
+            while leaves and num_nodes < self.max_nodes:
+                _, _, node = heapq.heappop(leaves)
+                self.split(node)
+                for child in node.children:
+                    num_nodes += 1
+                    heapq.heappush(leaves, (-child.traffic, num_nodes, child))
+
+        return root
+
+
+def print_tree(node, indent=0):
+    print '%s%s' % ('    ' * indent, node)
+    for child in node.children:
+        print_tree(child, indent + 1)
+
+
+def main(example_path, seed, sample_size):
+    with open(os.path.join(example_path, 'config.json'), 'r') as infile:
+        config = json.load(infile)
+
+    weights = None
+    if sample_size:
+        table, weights = load_sample(example_path, sample_size, seed=seed, table=True)[:2]
+        index = NDBIndex.from_table(table)
+    elif 'columns' in config['ndb_conf']:
+        index = NDBIndex.from_columns(load_columnar(example_path))
+    else:
+        table = load_example(os.path.join(example_path, config['ndb_conf']['topo']),
+                             os.path.join(example_path, config['ndb_conf']['data']), table=True)[0]
+        index = NDBIndex.from_table(table)
+
+    summarizer = Summarizer.from_config(config, seed=seed)
+    print_tree(summarizer.summarize(index, weights))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='path to the directory containing the example', type=str)
+    parser.add_argument('-s', '--seed', help='seed for the sampling of the flows', type=int, default=None)
+    parser.add_argument('-n', '--sample-size', help='summarize a traffic-weighted sample of this many flows which is '
+                                                    'drawn while loading', type=int)
+    parsed_args = parser.parse_args()
+
+    main(parsed_args.path, parsed_args.seed, parsed_args.sample_size)